@@ -0,0 +1,62 @@
+import jwt
+from django.conf import settings
+from graphql import GraphQLError
+from .models import User
+
+
+class RequestAuth:
+    # Outcome of authenticating one HTTP request: either a user or the reason
+    # the Authorization header was rejected.
+
+    def __init__(self, user=None, error=None, reason=None):
+        self.user = user
+        self.error = error
+        self.reason = reason
+
+
+def _authenticate(request):
+    auth_header = request.META.get('HTTP_AUTHORIZATION', None)
+    if not auth_header:
+        return RequestAuth(error="Authorization header is missing.", reason="missing_header")
+
+    parts = auth_header.split()
+    if len(parts) < 2:
+        return RequestAuth(error="Invalid token.", reason="malformed_header")
+
+    try:
+        payload = jwt.decode(parts[1], settings.SECRET_KEY, algorithms=["HS256"])
+    except jwt.ExpiredSignatureError:
+        return RequestAuth(error="Token has expired.", reason="expired")
+    except jwt.InvalidTokenError:
+        return RequestAuth(error="Invalid token.", reason="invalid")
+
+    username = payload.get('username')
+    if not username:
+        return RequestAuth(error="Invalid token.", reason="no_username")
+
+    try:
+        user = User.objects.get(username=username)
+    except User.DoesNotExist:
+        return RequestAuth(error="User does not exist.", reason="no_user")
+
+    request.user = user
+    return RequestAuth(user=user)
+
+
+def authenticate_request(request):
+    # Decode the token and load the user once per HTTP request. Every resolver
+    # in the document (and every operation of a batch) reuses the cached result.
+    auth = getattr(request, '_jwt_auth', None)
+    if auth is None:
+        auth = _authenticate(request)
+        request._jwt_auth = auth
+    return auth
+
+
+def get_authenticated_user(info, message="You must be logged in."):
+    auth = authenticate_request(info.context)
+    if auth.error:
+        raise GraphQLError(auth.error)
+    if not auth.user.is_authenticated:
+        raise GraphQLError(message)
+    return auth.user
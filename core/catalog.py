@@ -0,0 +1,121 @@
+import hashlib
+import threading
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from .cache import LRUCache
+from .models import Location, Sport, WorkoutCategory, Exercise
+
+CATALOG_MODELS = (Sport, Location, WorkoutCategory, Exercise)
+
+# One snapshot per catalog model: the full row list plus id and name indexes.
+# The tables are tiny and almost never change, so a warm process answers every
+# name lookup, relation load and list query without touching the database.
+_snapshots = LRUCache(
+    maxsize=getattr(settings, 'CATALOG_CACHE_MAXSIZE', 16),
+    ttl=getattr(settings, 'CATALOG_CACHE_TTL', 300),
+)
+
+# Catalog models this thread has written inside a transaction that is still
+# open. Their rows are uncommitted, so this thread reads past the shared
+# snapshots until the transaction ends either way.
+_pending = threading.local()
+
+
+class CatalogSnapshot:
+    def __init__(self, rows):
+        self.rows = rows
+        self.by_id = {row.id: row for row in rows}
+        self.by_name = {row.name: row for row in rows}
+        # Fingerprint of every column of every row, used for HTTP ETags
+        fields = rows[0]._meta.concrete_fields if rows else []
+        content = repr([[getattr(row, field.attname) for field in fields] for row in rows])
+        self.version = hashlib.sha256(content.encode()).hexdigest()[:16]
+
+
+def _pending_labels():
+    if not connections[DEFAULT_DB_ALIAS].in_atomic_block or not hasattr(_pending, "labels"):
+        # Committed or rolled back since the last write
+        _pending.labels = set()
+    return _pending.labels
+
+
+def _snapshot(model):
+    # Always built from the primary: the snapshot is shared by every request
+    # of the process, so one rebuilt from a lagging replica right after a
+    # write would hide the new row from everyone until it expires.
+    label = model._meta.label
+    if label in _pending_labels():
+        return CatalogSnapshot(list(model.objects.using(DEFAULT_DB_ALIAS).order_by('id')))
+    snapshot = _snapshots.get(label)
+    if snapshot is None:
+        snapshot = CatalogSnapshot(list(model.objects.using(DEFAULT_DB_ALIAS).order_by('id')))
+        _snapshots.set(label, snapshot)
+    return snapshot
+
+
+def _drop(model):
+    if model is None:
+        _snapshots.clear()
+    else:
+        _snapshots.delete(model._meta.label)
+
+
+def invalidate(model=None):
+    # Called whenever a catalog row is added, by the Create* mutations and by
+    # the implicit get-or-create paths below. Inside a transaction, another
+    # thread can rebuild the snapshot from committed rows before the new one
+    # commits, so it is dropped again on commit; until then this thread does
+    # not cache what it reads, so a rollback leaves nothing behind.
+    _drop(model)
+    if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+        models = CATALOG_MODELS if model is None else (model,)
+        _pending_labels().update(catalog_model._meta.label for catalog_model in models)
+        transaction.on_commit(lambda: _drop(model), using=DEFAULT_DB_ALIAS)
+
+
+def all_rows(model):
+    return _snapshot(model).rows
+
+
+def version(model):
+    # Changes whenever the rows served by all_rows() change
+    return _snapshot(model).version
+
+
+def get_by_ids(model, ids):
+    snapshot = _snapshot(model)
+    if any(id not in snapshot.by_id for id in ids):
+        # A row added by another process since the snapshot was taken
+        invalidate(model)
+        snapshot = _snapshot(model)
+    return {id: snapshot.by_id[id] for id in ids if id in snapshot.by_id}
+
+
+def get_or_create_by_name(model, name):
+    row = _snapshot(model).by_name.get(name)
+    if row is None:
+        row, created = model.objects.get_or_create(name=name)
+        invalidate(model)
+    return row
+
+
+def get_or_create_by_names(model, names):
+    # Resolve many names with the cached snapshot, falling back to one lookup
+    # and one bulk insert for the missing ones.
+    names = {name for name in names}
+    known = _snapshot(model).by_name
+    rows = {name: known[name] for name in names if name in known}
+
+    missing = names - rows.keys()
+    if missing:
+        # ignore_conflicts keeps concurrent writers from failing on the unique
+        # name; the re-read picks up rows inserted by either side.
+        model.objects.bulk_create([model(name=name) for name in missing], ignore_conflicts=True)
+        rows.update((row.name, row) for row in model.objects.using(DEFAULT_DB_ALIAS).filter(name__in=missing))
+        invalidate(model)
+
+    return rows
+
+
+def get_or_create_exercises(names):
+    return get_or_create_by_names(Exercise, names)
@@ -0,0 +1,123 @@
+from django.conf import settings
+from graphql import (
+    FieldNode,
+    FragmentSpreadNode,
+    GraphQLList,
+    InlineFragmentNode,
+    IntValueNode,
+    VariableNode,
+    get_named_type,
+    get_nullable_type,
+)
+
+from .pagination import DEFAULT_PAGE_SIZE, unbounded_list_size
+
+# Arguments that bound the size of a list field
+LIMIT_ARGUMENTS = ("limit", "first", "maxPoints")
+
+# Types whose list fields only re-shape rows already counted by the limit of
+# the field that returned them (grouping a page by date, edges of a page).
+PAGE_TYPES = {
+    "WorkoutPaginationType",
+    "WorkoutCursorPaginationType",
+    "WorkoutGroupType",
+    "WorkoutDetailConnectionType",
+    "UserConnectionType",
+    "ExerciseConnectionType",
+}
+
+
+class QueryCost:
+    def __init__(self, cost, depth):
+        self.cost = cost
+        self.depth = depth
+
+
+def _is_list(graphql_type):
+    return isinstance(get_nullable_type(graphql_type), GraphQLList)
+
+
+def _limit_argument(field_node, field_def, variables):
+    # Returns the requested page size, the argument's declared default when a
+    # limit argument exists but was omitted, or None when the field takes no
+    # limit at all.
+    names = [name for name in LIMIT_ARGUMENTS if name in field_def.args]
+    if not names:
+        return None
+    for argument in field_node.arguments:
+        if argument.name.value in names:
+            if isinstance(argument.value, IntValueNode):
+                return int(argument.value.value)
+            if isinstance(argument.value, VariableNode):
+                value = variables.get(argument.value.name.value)
+                if isinstance(value, int):
+                    return value
+    default = field_def.args[names[0]].default_value
+    return default if isinstance(default, int) else DEFAULT_PAGE_SIZE
+
+
+def _list_size(field_node, field_def, parent_type, variables, is_root):
+    limit = _limit_argument(field_node, field_def, variables)
+    if limit is not None:
+        return max(min(limit, getattr(settings, 'GRAPHQL_MAX_PAGE_SIZE', 100)), 1)
+    if not _is_list(field_def.type) or parent_type.name in PAGE_TYPES:
+        return 1
+    # Lists without a limit: whole tables at the root, child rows below it
+    if is_root:
+        return unbounded_list_size()
+    return getattr(settings, 'GRAPHQL_NESTED_LIST_SIZE', 20)
+
+
+def _selection_cost(schema, fragments, variables, parent_type, selection_set, multiplier, depth, is_root=False):
+    cost = 0
+    max_depth = depth
+    for selection in selection_set.selections:
+        if isinstance(selection, FieldNode):
+            name = selection.name.value
+            if name.startswith("__"):
+                continue
+            field_def = parent_type.fields.get(name)
+            if field_def is None:
+                continue
+            size = _list_size(selection, field_def, parent_type, variables, is_root)
+            cost += multiplier
+            if selection.selection_set:
+                child_cost, child_depth = _selection_cost(
+                    schema, fragments, variables, get_named_type(field_def.type),
+                    selection.selection_set, multiplier * size, depth + 1,
+                )
+                cost += child_cost
+                max_depth = max(max_depth, child_depth)
+        else:
+            if isinstance(selection, FragmentSpreadNode):
+                fragment = fragments.get(selection.name.value)
+                if fragment is None:
+                    continue
+                type_condition, fragment_selection = fragment.type_condition, fragment.selection_set
+            elif isinstance(selection, InlineFragmentNode):
+                type_condition, fragment_selection = selection.type_condition, selection.selection_set
+            else:
+                continue
+            fragment_type = schema.get_type(type_condition.name.value) if type_condition else parent_type
+            child_cost, child_depth = _selection_cost(
+                schema, fragments, variables, fragment_type, fragment_selection, multiplier, depth, is_root,
+            )
+            cost += child_cost
+            max_depth = max(max_depth, child_depth)
+    return cost, max_depth
+
+
+def calculate_cost(schema, document, operation_ast, variables=None):
+    # Static estimate of how many fields an operation resolves: every field
+    # costs one per parent row, list fields multiply their children by the
+    # requested limit (capped) or an assumed size when they have no limit.
+    fragments = {
+        definition.name.value: definition
+        for definition in document.definitions
+        if definition.kind == "fragment_definition"
+    }
+    root_type = schema.get_root_type(operation_ast.operation)
+    cost, depth = _selection_cost(
+        schema, fragments, variables or {}, root_type, operation_ast.selection_set, 1, 1, is_root=True,
+    )
+    return QueryCost(cost, depth)
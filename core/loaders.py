@@ -0,0 +1,115 @@
+import threading
+from collections import defaultdict
+from . import catalog
+from .models import Location, Sport, WorkoutCategory, Exercise, Workout, WorkoutDetail, User
+
+
+class BatchLoader:
+    # Collects keys for one relation and resolves all of them with a single query
+    # the first time any of them is actually needed.
+
+    def __init__(self, batch_load_fn, default=None):
+        self.batch_load_fn = batch_load_fn
+        self.default = default
+        self.cache = {}
+        self.pending = set()
+        # Root fields of one request may resolve on parallel threads (see
+        # core.views.AsyncFitnessGraphQLView), so loader state is locked.
+        self.lock = threading.Lock()
+
+    def prime(self, keys):
+        with self.lock:
+            self.pending.update(key for key in keys if key is not None and key not in self.cache)
+
+    def load(self, key):
+        if key is None:
+            return None
+        with self.lock:
+            if key in self.cache:
+                return self.cache[key]
+            self.pending.add(key)
+        self.dispatch()
+        with self.lock:
+            if key in self.cache:
+                return self.cache[key]
+        # Another thread took this key into its batch and has not stored it yet
+        self._store([key], self.batch_load_fn([key]))
+        return self.cache[key]
+
+    def dispatch(self):
+        # The batch query runs outside the lock: loading one relation primes
+        # others, and holding locks across loaders could deadlock.
+        with self.lock:
+            keys = list(self.pending)
+            self.pending.clear()
+        if keys:
+            self._store(keys, self.batch_load_fn(keys))
+
+    def _store(self, keys, results):
+        with self.lock:
+            for key in keys:
+                self.cache[key] = results.get(key, self.default() if callable(self.default) else self.default)
+
+
+def _by_id(model):
+    def load(ids):
+        return {obj.id: obj for obj in model.objects.filter(id__in=ids)}
+    return load
+
+
+class Loaders:
+    # One set of loaders per HTTP request, so every workout on a page shares
+    # the same batched query for each relation.
+
+    def __init__(self):
+        # Catalog relations are served from the in-process catalog cache
+        self.sports = BatchLoader(lambda ids: catalog.get_by_ids(Sport, ids))
+        self.locations = BatchLoader(lambda ids: catalog.get_by_ids(Location, ids))
+        self.workout_categories = BatchLoader(lambda ids: catalog.get_by_ids(WorkoutCategory, ids))
+        self.exercises = BatchLoader(lambda ids: catalog.get_by_ids(Exercise, ids))
+        self.users = BatchLoader(_by_id(User))
+        self.workouts = BatchLoader(self._load_workouts)
+        self.details = BatchLoader(self._load_details, default=list)
+
+    def _load_workouts(self, ids):
+        workouts = {workout.id: workout for workout in Workout.objects.filter(id__in=ids)}
+        self.prime_workouts(list(workouts.values()))
+        return workouts
+
+    def _load_details(self, workout_ids):
+        details = defaultdict(list)
+        for detail in WorkoutDetail.objects.filter(workout_id__in=workout_ids).order_by('id'):
+            details[detail.workout_id].append(detail)
+        self.prime_details([detail for rows in details.values() for detail in rows])
+        return details
+
+    def prime_workouts(self, workouts):
+        # Register every relation key of a page up front so the first resolver
+        # that touches a relation loads it for the whole page.
+        for workout in workouts:
+            self.workouts.cache.setdefault(workout.id, workout)
+        self.sports.prime(workout.sport_id for workout in workouts)
+        self.locations.prime(workout.location_id for workout in workouts)
+        self.workout_categories.prime(workout.workout_category_id for workout in workouts)
+        self.users.prime(workout.user_id for workout in workouts)
+        self.details.prime(workout.id for workout in workouts)
+        return workouts
+
+    def prime_details(self, details):
+        self.exercises.prime(detail.exercise_id for detail in details)
+        self.workouts.prime(detail.workout_id for detail in details)
+        return details
+
+
+_loaders_lock = threading.Lock()
+
+
+def get_loaders(context):
+    loaders = getattr(context, '_loaders', None)
+    if loaders is None:
+        with _loaders_lock:
+            loaders = getattr(context, '_loaders', None)
+            if loaders is None:
+                loaders = Loaders()
+                context._loaders = loaders
+    return loaders
@@ -0,0 +1,106 @@
+import asyncio
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client, override_settings
+from graphql_jwt.shortcuts import get_token
+
+# A dashboard-style document: several independent root fields, one of them an
+# aggregate, which is what the async view runs concurrently.
+DASHBOARD_QUERY = """
+query Dashboard($exercise: String!) {
+  allWorkouts(limit: 20, offset: 0) { totalCount groupedItems { date workouts { id sport { name } details { reps weight } } } }
+  attendanceSummary { sport thisWeekCount lastWeekCount totalCount }
+  maxWeightPerReps(exerciseName: $exercise) { reps maxWeight }
+  allSports { name }
+  allExercises { name }
+}
+"""
+
+
+def _summary(label, latencies, elapsed):
+    latencies = sorted(latencies)
+    return {
+        "path": label,
+        "requests": len(latencies),
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 2),
+    }
+
+
+class Command(BaseCommand):
+    help = "Compare GraphQL throughput of the WSGI view (/graphql/) and the ASGI view (/graphql/async/) under concurrent clients"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', help="User to run the operations as (defaults to the first user)")
+        parser.add_argument('--exercise', default="Squat", help="Exercise name for maxWeightPerReps")
+        parser.add_argument('--clients', type=int, default=8, help="Concurrent clients")
+        parser.add_argument('--requests', type=int, default=20, help="Requests per client")
+        parser.add_argument('--json', action='store_true', help="Print the results as JSON")
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        users = User.objects.order_by('id')
+        user = users.filter(username=options['username']).first() if options['username'] else users.first()
+        if user is None:
+            raise CommandError("No user to benchmark with; run seed_workouts or pass --username.")
+
+        headers = {"Authorization": f"Bearer {get_token(user)}"}
+        body = json.dumps({"query": DASHBOARD_QUERY, "variables": {"exercise": options['exercise']}})
+        clients, per_client = options['clients'], options['requests']
+
+        # The in-process test clients send Host: testserver
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            results = [
+                self.run_wsgi(body, headers, clients, per_client),
+                asyncio.run(self.run_asgi(body, headers, clients, per_client)),
+            ]
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for result in results:
+            self.stdout.write(
+                f"{result['path']:<20} {result['requests_per_second']:>8} req/s  "
+                f"p50 {result['p50_ms']:>8} ms  p95 {result['p95_ms']:>8} ms  ({result['requests']} requests)"
+            )
+
+    def run_wsgi(self, body, headers, clients, per_client):
+        def client_loop(_):
+            client = Client()
+            latencies = []
+            for _ in range(per_client):
+                started = time.perf_counter()
+                response = client.post('/graphql/', body, content_type='application/json', headers=headers)
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    raise CommandError(f"/graphql/ returned {response.status_code}: {response.content[:200]}")
+            return latencies
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=clients) as pool:
+            latencies = [latency for batch in pool.map(client_loop, range(clients)) for latency in batch]
+        return _summary("wsgi /graphql/", latencies, time.perf_counter() - started)
+
+    async def run_asgi(self, body, headers, clients, per_client):
+        async def client_loop():
+            client = AsyncClient()
+            latencies = []
+            for _ in range(per_client):
+                started = time.perf_counter()
+                response = await client.post('/graphql/async/', body, content_type='application/json', headers=headers)
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    raise CommandError(f"/graphql/async/ returned {response.status_code}: {response.content[:200]}")
+            return latencies
+
+        started = time.perf_counter()
+        batches = await asyncio.gather(*[client_loop() for _ in range(clients)])
+        latencies = [latency for batch in batches for latency in batch]
+        return _summary("asgi /graphql/async/", latencies, time.perf_counter() - started)
@@ -0,0 +1,104 @@
+import json
+import statistics
+import time
+from io import BytesIO
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import RequestFactory, override_settings
+
+# Touches the database once (exercisesPage bypasses the catalog cache), needs no token
+PROBE_QUERY = "{ exercisesPage(first: 1) { items { name } } }"
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure per-request database connection overhead with and without connection reuse, "
+        "by sending requests through the real WSGI handler as a warm serverless instance would"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--max-age', type=int, default=60, help="CONN_MAX_AGE for the reuse run")
+        parser.add_argument('--json', action='store_true', help="Print the results as JSON")
+
+    def handle(self, *args, **options):
+        # The test Client keeps one connection open for the whole run; the WSGI
+        # handler fires request_started/request_finished like a real server,
+        # which is where Django closes or keeps the connection.
+        handler = WSGIHandler()
+        body = json.dumps({"query": PROBE_QUERY})
+        environ = RequestFactory().post('/graphql/', body, content_type='application/json').environ
+        environ['CONTENT_LENGTH'] = str(len(body.encode()))
+
+        original = {key: connection.settings_dict[key] for key in ('CONN_MAX_AGE', 'CONN_HEALTH_CHECKS')}
+        runs = [
+            ("new connection per request", 0, False),
+            (f"reuse (max age {options['max_age']}s, health checks)", options['max_age'], True),
+        ]
+        results = []
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            try:
+                for label, max_age, health_checks in runs:
+                    connection.close()
+                    connection.settings_dict['CONN_MAX_AGE'] = max_age
+                    connection.settings_dict['CONN_HEALTH_CHECKS'] = health_checks
+                    results.append(self.run(label, handler, environ, body.encode(), options['requests']))
+            finally:
+                connection.close()
+                connection.settings_dict.update(original)
+
+        if options['json']:
+            self.stdout.write(json.dumps({"database": connection.vendor, "runs": results}, indent=2))
+            return
+        self.stdout.write(f"database: {connection.vendor}")
+        for result in results:
+            self.stdout.write(
+                f"{result['mode']:<42} p50 {result['p50_ms']:>7} ms  p95 {result['p95_ms']:>7} ms  "
+                f"{result['connections_opened']:>4} connections  connect {result['connect_ms_total']:>8} ms total"
+            )
+
+    def run(self, label, handler, environ, body, count):
+        connects = []
+
+        def on_connect(sender, connection, **kwargs):
+            connects.append(connection.alias)
+
+        # Time spent opening connections, measured around the backend's connect()
+        connect_time = [0.0]
+        connect = connection.connect
+
+        def timed_connect():
+            started = time.perf_counter()
+            try:
+                connect()
+            finally:
+                connect_time[0] += time.perf_counter() - started
+
+        connection_created.connect(on_connect)
+        connection.connect = timed_connect
+        latencies = []
+        try:
+            for _ in range(count):
+                started = time.perf_counter()
+                response = handler(dict(environ, **{'wsgi.input': BytesIO(body)}), lambda status, headers: None)
+                response.close()  # Fires request_finished
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    raise CommandError(f"/graphql/ returned {response.status_code}: {response.content[:200]}")
+        finally:
+            del connection.connect
+            connection_created.disconnect(on_connect)
+
+        latencies.sort()
+        return {
+            "mode": label,
+            "requests": count,
+            "p50_ms": round(statistics.median(latencies) * 1000, 2),
+            "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 2),
+            "connections_opened": len(connects),
+            "connect_ms_total": round(connect_time[0] * 1000, 2),
+        }
+
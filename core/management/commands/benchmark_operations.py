@@ -0,0 +1,213 @@
+import json
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from graphql_jwt.shortcuts import get_token
+
+from core.models import Workout
+from core.schema import schema
+
+ALL_WORKOUTS_QUERY = """
+query AllWorkouts($limit: Int, $offset: Int) {
+  allWorkouts(limit: $limit, offset: $offset) {
+    totalCount
+    groupedItems { date workouts { id duration sport { name } location { name } details { reps weight exercise { name } } } }
+  }
+}
+"""
+
+ATTENDANCE_QUERY = """
+query Attendance {
+  crossfitAttendanceCount
+  crossfitAttendanceLastWeekCount
+  crossfitAttendanceTotalCount
+  swimmingAttendanceCount
+  swimmingAttendanceLastWeekCount
+  swimmingAttendanceTotalCount
+}
+"""
+
+MAX_WEIGHT_QUERY = """
+query MaxWeight($exercise: String!) {
+  maxWeightPerReps(exerciseName: $exercise) { reps maxWeight achievedOn }
+}
+"""
+
+CREATE_WORKOUT_MUTATION = """
+mutation Create($date: Date!, $exercise: String!) {
+  createWorkout(
+    date: $date, sportName: "CrossFit", workoutCategoryName: "Strength", locationName: "Home Gym", duration: 60,
+    workoutDetailsInput: [
+      {exerciseName: $exercise, reps: 5, weight: 100, order: 1},
+      {exerciseName: $exercise, reps: 5, weight: 100, order: 2},
+      {exerciseName: $exercise, reps: 3, weight: 110, order: 3}
+    ]
+  ) { workout { id } workoutDetails { id } }
+}
+"""
+
+UPDATE_WORKOUT_MUTATION = """
+mutation Update($id: ID!, $details: [UpdateWorkoutDetailInputType]) {
+  updateWorkout(workoutId: $id, duration: 75, workoutDetailsInput: $details) { workout { id } workoutDetails { id } }
+}
+"""
+
+
+def _update_variables(workout):
+    # Resend every detail of the workout with one set changed, which is what
+    # the app's edit screen does.
+    details = [
+        {
+            "id": str(detail.id),
+            "exerciseName": detail.exercise.name,
+            "reps": detail.reps,
+            "weight": int(detail.weight) if detail.weight is not None else None,
+            "calories": detail.calories,
+            "distance": detail.distance,
+            "duration": detail.duration,
+            "order": detail.order,
+        }
+        for detail in workout.details.select_related('exercise').order_by('id')
+    ]
+    if details and details[0]["reps"] is not None:
+        details[0]["reps"] += 1
+    return {"id": str(workout.id), "details": details}
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[max(int(len(values) * fraction + 0.5) - 1, 0)]
+
+
+class Command(BaseCommand):
+    help = "Time the main GraphQL operations against the current database and compare with a saved baseline"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', help="User to run the operations as (defaults to the first seeded user)")
+        parser.add_argument('--exercise', default="Squat", help="Exercise name for maxWeightPerReps and createWorkout")
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--operation', action='append', help="Only run the named operation(s)")
+        parser.add_argument('--save', metavar='PATH', help="Write the results as a JSON baseline")
+        parser.add_argument('--compare', metavar='PATH', help="Compare with a JSON baseline and fail on regressions")
+        parser.add_argument(
+            '--tolerance', type=float, default=0.25,
+            help="Allowed p95 slowdown against the baseline, as a fraction (default 0.25)",
+        )
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        if options['username']:
+            user = User.objects.filter(username=options['username']).first()
+        else:
+            user = (
+                User.objects.filter(username__startswith="bench_user_").order_by('id').first()
+                or User.objects.order_by('id').first()
+            )
+        if user is None:
+            raise CommandError("No user to benchmark with; run seed_workouts or pass --username.")
+
+        latest = Workout.objects.filter(user=user).order_by('-date', '-id').first()
+        if latest is None:
+            raise CommandError(f"{user.username} has no workouts; run seed_workouts first.")
+
+        exercise = options['exercise']
+        operations = {
+            "allWorkouts first page": (ALL_WORKOUTS_QUERY, {"limit": 20, "offset": 0}),
+            "allWorkouts page 10": (ALL_WORKOUTS_QUERY, {"limit": 20, "offset": 180}),
+            "attendance counters": (ATTENDANCE_QUERY, None),
+            "maxWeightPerReps": (MAX_WEIGHT_QUERY, {"exercise": exercise}),
+            "createWorkout": (CREATE_WORKOUT_MUTATION, {"date": latest.date.isoformat(), "exercise": exercise}),
+            "updateWorkout": (UPDATE_WORKOUT_MUTATION, _update_variables(latest)),
+        }
+        if options['operation']:
+            unknown = set(options['operation']) - operations.keys()
+            if unknown:
+                raise CommandError(f"Unknown operation(s): {', '.join(sorted(unknown))}")
+            operations = {name: operations[name] for name in options['operation']}
+
+        token = get_token(user)
+        results = {}
+        for name, (document, variables) in operations.items():
+            results[name] = self.measure(document, variables, token, options['iterations'], options['warmup'])
+            result = results[name]
+            self.stdout.write(
+                f"{name:<24} p50 {result['p50_ms']:>8} ms  p95 {result['p95_ms']:>8} ms  "
+                f"{result['queries']:>3} queries  {result['sql_ms']:>8} ms SQL"
+            )
+
+        baseline = {
+            "database": connection.vendor,
+            "user": user.username,
+            "iterations": options['iterations'],
+            "operations": results,
+        }
+        if options['save']:
+            with open(options['save'], 'w') as f:
+                json.dump(baseline, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Saved baseline to {options['save']}"))
+        if options['compare']:
+            self.compare(results, options['compare'], options['tolerance'])
+
+    def measure(self, document, variables, token, iterations, warmup):
+        factory = RequestFactory()
+        latencies = []
+        query_counts = []
+        sql_times = []
+        for iteration in range(warmup + iterations):
+            # A new request per run: auth and the loaders are cached on it
+            request = factory.post('/graphql/', HTTP_AUTHORIZATION=f"Bearer {token}")
+            request.user = AnonymousUser()
+            # Mutations are rolled back so every run sees the same data
+            with transaction.atomic(), CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                result = schema.execute(document, context_value=request, variable_values=variables)
+                elapsed = time.perf_counter() - started
+                transaction.set_rollback(True)
+            if result.errors:
+                raise CommandError(f"Operation failed: {result.errors[0]}")
+            if iteration >= warmup:
+                latencies.append(elapsed)
+                query_counts.append(len(captured.captured_queries))
+                sql_times.append(sum(float(query['time']) for query in captured.captured_queries))
+
+        return {
+            "p50_ms": round(statistics.median(latencies) * 1000, 2),
+            "p95_ms": round(_percentile(latencies, 0.95) * 1000, 2),
+            "queries": max(query_counts),
+            "sql_ms": round(statistics.median(sql_times) * 1000, 2),
+        }
+
+    def compare(self, results, path, tolerance):
+        try:
+            with open(path) as f:
+                baseline = json.load(f)["operations"]
+        except (OSError, ValueError, KeyError) as e:
+            raise CommandError(f"Cannot read baseline {path}: {e}")
+
+        regressions = []
+        for name, result in results.items():
+            before = baseline.get(name)
+            if before is None:
+                self.stdout.write(f"{name:<24} not in baseline")
+                continue
+            change = (result['p95_ms'] - before['p95_ms']) / before['p95_ms'] if before['p95_ms'] else 0
+            line = (
+                f"{name:<24} p95 {before['p95_ms']} -> {result['p95_ms']} ms ({change:+.0%}), "
+                f"queries {before['queries']} -> {result['queries']}"
+            )
+            # Query counts are deterministic, timings are not
+            if result['queries'] > before['queries'] or change > tolerance:
+                regressions.append(name)
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(line)
+
+        if regressions:
+            raise CommandError(f"{len(regressions)} operation(s) regressed against {path}: {', '.join(regressions)}")
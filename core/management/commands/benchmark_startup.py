@@ -0,0 +1,86 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter, the way a cold serverless instance starts:
+# import the WSGI application, then serve one GraphQL request through it.
+# Nearly all of that time goes to importing Django's request handling,
+# graphene and graphql-relay: a settings profile without the admin, sessions
+# and templates loaded ~60 fewer modules but started no faster.
+COLD_START_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+from oleinikov_fitnesslogbook_backend.wsgi import application
+imported = time.perf_counter()
+
+from io import BytesIO
+body = json.dumps({"query": "{ __typename }"}).encode()
+environ = {
+    "REQUEST_METHOD": "POST", "PATH_INFO": "/graphql/", "SERVER_NAME": "localhost", "SERVER_PORT": "80",
+    "HTTP_HOST": "localhost", "CONTENT_TYPE": "application/json", "CONTENT_LENGTH": str(len(body)),
+    "wsgi.input": BytesIO(body), "wsgi.url_scheme": "http", "wsgi.errors": sys.stderr,
+}
+statuses = []
+response = application(environ, lambda status, headers: statuses.append(status))
+content = b"".join(response)
+response.close()
+finished = time.perf_counter()
+
+print(json.dumps({
+    "status": statuses[0],
+    "import_ms": (imported - started) * 1000,
+    "first_response_ms": (finished - started) * 1000,
+    "modules": len(sys.modules),
+}))
+"""
+
+class Command(BaseCommand):
+    help = "Measure cold-start import time and time to first response for one or more settings modules"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help="Fresh interpreters per profile")
+        parser.add_argument(
+            '--settings-module', action='append', dest='settings_modules',
+            help="Settings module to measure; repeat to compare several. Defaults to the current one.",
+        )
+        parser.add_argument('--json', action='store_true', help="Print the results as JSON")
+
+    def handle(self, *args, **options):
+        results = []
+        for settings_module in options['settings_modules'] or [settings.SETTINGS_MODULE]:
+            samples = [self.cold_start(settings_module) for _ in range(options['runs'])]
+            results.append({
+                "settings": settings_module,
+                "runs": len(samples),
+                "import_ms": round(statistics.median(sample["import_ms"] for sample in samples), 1),
+                "first_response_ms": round(statistics.median(sample["first_response_ms"] for sample in samples), 1),
+                "modules": samples[-1]["modules"],
+            })
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for result in results:
+            self.stdout.write(
+                f"{result['settings']}  import {result['import_ms']:>7} ms  "
+                f"first response {result['first_response_ms']:>7} ms  {result['modules']:>5} modules  "
+                f"(median of {result['runs']})"
+            )
+
+    def cold_start(self, settings_module):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings_module)
+        completed = subprocess.run(
+            [sys.executable, "-c", COLD_START_SCRIPT],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        if completed.returncode != 0:
+            raise CommandError(f"{settings_module} failed to start:\n{completed.stderr[-2000:]}")
+        sample = json.loads(completed.stdout.strip().splitlines()[-1])
+        if not sample["status"].startswith("200"):
+            raise CommandError(f"{settings_module} answered the first request with {sample['status']}")
+        return sample
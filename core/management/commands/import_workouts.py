@@ -0,0 +1,38 @@
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.transfer import FORMATS, TransferError, detect_format, import_workouts, read_rows
+
+
+class Command(BaseCommand):
+    help = "Import a CSV or NDJSON workout log (one row per workout detail) into a user's history"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or - for stdin")
+        parser.add_argument('--username', required=True)
+        parser.add_argument('--format', choices=FORMATS, help="Defaults to the file extension, CSV for stdin")
+        parser.add_argument('--chunk-size', type=int, default=500, help="Workouts per transaction")
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['username']!r} does not exist.")
+
+        path = options['path']
+        format = options['format'] or detect_format(name=None if path == '-' else path)
+        stream = sys.stdin if path == '-' else open(path, encoding='utf-8-sig', newline='')
+        try:
+            imported = import_workouts(user, read_rows(stream, format), chunk_size=options['chunk_size'])
+        except TransferError as e:
+            raise CommandError(f"{e} ({(e.imported or {}).get('workouts', 0)} workouts imported before it)")
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {imported['workouts']} workouts and {imported['details']} details for {user.username}"
+        ))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from core.rollups import rebuild_attendance
+
+
+class Command(BaseCommand):
+    help = "Rebuild the DailyAttendance rollup from the Workout table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            created = rebuild_attendance(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {created} daily attendance rows"))
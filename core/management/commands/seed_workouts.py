@@ -0,0 +1,155 @@
+import datetime
+import random
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core import catalog
+from core.models import Location, Sport, Workout, WorkoutCategory, WorkoutDetail
+from core.rollups import rebuild_attendance, rebuild_personal_records
+
+# Relative frequency of each sport, and the category / exercises a session of
+# it draws from. Strength work has sets of reps at a weight; conditioning work
+# has distance, duration and calories.
+SPORTS = {
+    "CrossFit": (0.35, "Strength", ["Squat", "Deadlift", "Clean", "Snatch", "Pull Up", "Push Press"]),
+    "Weightlifting": (0.25, "Strength", ["Squat", "Bench Press", "Deadlift", "Overhead Press", "Barbell Row"]),
+    "Swimming": (0.2, "Cardio", ["Freestyle", "Breaststroke", "Backstroke"]),
+    "Running": (0.15, "Cardio", ["Easy Run", "Intervals", "Long Run"]),
+    "Cycling": (0.05, "Cardio", ["Road Ride", "Spin Class"]),
+}
+LOCATIONS = ["Home Gym", "City Gym", "Pool", "Park", "Track"]
+
+# Low rep sets are heavy, high rep sets light: the fraction of a lifter's
+# one-rep max each rep count is usually done at.
+REP_SCHEMES = {1: 0.95, 3: 0.9, 5: 0.85, 8: 0.78, 10: 0.74, 12: 0.7}
+
+
+def _strength_details(rng, exercises, strength, progress):
+    details = []
+    order = 1
+    for exercise in rng.sample(exercises, k=min(len(exercises), rng.randint(2, 4))):
+        reps = rng.choice(list(REP_SCHEMES))
+        # Strength grows through the history, with day-to-day noise
+        one_rep_max = strength[exercise] * (1 + 0.4 * progress) * rng.uniform(0.93, 1.05)
+        weight = Decimal(max(round(one_rep_max * REP_SCHEMES[reps]), 5))
+        for _ in range(rng.randint(3, 5)):
+            details.append({"exercise": exercise, "reps": reps, "weight": weight, "order": order})
+            order += 1
+    return details
+
+
+def _cardio_details(rng, exercises):
+    exercise = rng.choice(exercises)
+    duration = max(int(rng.gauss(45, 12)), 10)
+    return [{
+        "exercise": exercise,
+        "duration": duration,
+        "distance": int(duration * rng.uniform(60, 200)),
+        "calories": int(duration * rng.uniform(7, 12)),
+        "order": 1,
+    }]
+
+
+class Command(BaseCommand):
+    help = "Seed users with years of synthetic workouts for benchmarking"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--years', type=float, default=2)
+        parser.add_argument('--sessions-per-week', type=float, default=3.5, help="Average sessions per user per week")
+        parser.add_argument('--username-prefix', default="bench_user_")
+        parser.add_argument('--password', default="benchmark")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed, for reproducible datasets")
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--clear', action='store_true', help="Delete previously seeded users (and their workouts) first")
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        rng = random.Random(options['seed'])
+        prefix = options['username_prefix']
+        batch_size = options['batch_size']
+
+        if options['clear']:
+            deleted, _ = User.objects.filter(username__startswith=prefix).delete()
+            self.stdout.write(f"Deleted {deleted} rows of previously seeded data")
+        elif User.objects.filter(username__startswith=prefix).exists():
+            raise CommandError(f"Users starting with {prefix!r} already exist; pass --clear to replace them.")
+
+        sports = {name: catalog.get_or_create_by_name(Sport, name) for name in SPORTS}
+        categories = {
+            name: catalog.get_or_create_by_name(WorkoutCategory, name)
+            for name in {category for _, category, _ in SPORTS.values()}
+        }
+        locations = [catalog.get_or_create_by_name(Location, name) for name in LOCATIONS]
+        exercises = catalog.get_or_create_exercises(
+            name for _, _, names in SPORTS.values() for name in names
+        )
+        sport_names = list(SPORTS)
+        sport_weights = [weight for weight, _, _ in SPORTS.values()]
+
+        end = datetime.date.today()
+        days = int(options['years'] * 365)
+        start = end - datetime.timedelta(days=days)
+
+        total_workouts = total_details = 0
+        for index in range(options['users']):
+            username = f"{prefix}{index + 1}"
+            # Users differ in how often they train and how strong they start
+            sessions_per_week = max(rng.gauss(options['sessions_per_week'], 1), 0.5)
+            strength = {name: rng.uniform(40, 140) for name in exercises}
+            home = rng.choice(locations)
+
+            sessions = []
+            for offset in range(days + 1):
+                day = start + datetime.timedelta(days=offset)
+                # Fewer sessions at the weekend, and the odd two-a-day
+                chance = sessions_per_week / 7 * (0.6 if day.weekday() >= 5 else 1.16)
+                count = (rng.random() < chance) + (rng.random() < chance * 0.05)
+                for _ in range(count):
+                    sport_name = rng.choices(sport_names, weights=sport_weights)[0]
+                    _, category, exercise_names = SPORTS[sport_name]
+                    if category == "Strength":
+                        details = _strength_details(rng, exercise_names, strength, offset / max(days, 1))
+                    else:
+                        details = _cardio_details(rng, exercise_names)
+                    sessions.append((day, sport_name, category, details))
+
+            with transaction.atomic():
+                user = User.objects.create_user(
+                    username=username, password=options['password'], email=f"{username}@example.com"
+                )
+                for chunk_start in range(0, len(sessions), batch_size):
+                    chunk = sessions[chunk_start:chunk_start + batch_size]
+                    workouts = Workout.objects.bulk_create([
+                        Workout(
+                            user=user,
+                            date=day,
+                            sport=sports[sport_name],
+                            workout_category=categories[category],
+                            duration=max(int(rng.gauss(60, 15)), 15),
+                            location=home if rng.random() < 0.8 else rng.choice(locations),
+                        )
+                        for day, sport_name, category, _ in chunk
+                    ])
+                    details = [
+                        WorkoutDetail(workout=workout, **{**detail, "exercise": exercises[detail["exercise"]]})
+                        for workout, (_, _, _, session_details) in zip(workouts, chunk)
+                        for detail in session_details
+                    ]
+                    WorkoutDetail.objects.bulk_create(details, batch_size=batch_size)
+                    total_workouts += len(workouts)
+                    total_details += len(details)
+            self.stdout.write(f"{username}: {len(sessions)} workouts")
+
+        # The bulk inserts bypass the mutation-side rollup refresh
+        with transaction.atomic():
+            attendance = rebuild_attendance(batch_size=batch_size)
+            records = rebuild_personal_records(batch_size=batch_size)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {options['users']} users, {total_workouts} workouts, {total_details} details "
+            f"({attendance} attendance rows, {records} personal records)"
+        ))
@@ -0,0 +1,113 @@
+import random
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import QuerySet
+
+# Header a client can send to force a trace when DEBUG is on
+TRACE_HEADER = "HTTP_X_GRAPHQL_TRACE"
+
+_trace_lock = threading.Lock()
+
+
+class _QueryCounter:
+    # execute_wrapper hook counting the queries run inside it
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - started
+
+
+class Trace:
+    # Per-request totals, keyed by field path with list indexes dropped, so the
+    # 200 `sport` lookups of one page show up as a single line with calls=200.
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.fields = {}
+        self.lock = threading.Lock()
+
+    def record(self, path, duration, queries, sql_duration):
+        with self.lock:
+            field = self.fields.setdefault(path, [0, 0.0, 0, 0.0])
+            field[0] += 1
+            field[1] += duration
+            field[2] += queries
+            field[3] += sql_duration
+
+    def as_dict(self):
+        with self.lock:
+            fields = sorted(self.fields.items(), key=lambda item: item[1][1], reverse=True)
+            return {
+                "durationMs": round((time.perf_counter() - self.started) * 1000, 2),
+                "queries": sum(field[2] for _, field in fields),
+                "sqlMs": round(sum(field[3] for _, field in fields) * 1000, 2),
+                "resolvers": [
+                    {
+                        "path": path,
+                        "calls": calls,
+                        "durationMs": round(duration * 1000, 2),
+                        "queries": queries,
+                        "sqlMs": round(sql_duration * 1000, 2),
+                    }
+                    for path, (calls, duration, queries, sql_duration) in fields
+                ],
+            }
+
+
+def get_trace(request):
+    # The request's trace, or None when this request is not sampled
+    return getattr(request, "_graphql_trace", None)
+
+
+def _start_trace(request):
+    # Sampled once per request. The ASGI view resolves root fields on several
+    # threads at once, hence the lock.
+    with _trace_lock:
+        if not hasattr(request, "_graphql_trace"):
+            sample_rate = getattr(settings, 'GRAPHQL_TRACE_SAMPLE_RATE', 0.0)
+            forced = settings.DEBUG and request.META.get(TRACE_HEADER) in ("1", "true")
+            sampled = forced or (sample_rate > 0 and random.random() < sample_rate)
+            request._graphql_trace = Trace() if sampled else None
+        return request._graphql_trace
+
+
+class InstrumentationMiddleware:
+    # Records wall time and SQL count/duration for every resolver of a sampled
+    # request. Unsampled requests pay for one attribute lookup per field. The
+    # view adds the trace to the response `extensions` and/or the
+    # `core.graphql` log once execution is done (GRAPHQL_TRACE_OUTPUT).
+    def resolve(self, next, root, info, **args):
+        request = info.context
+        trace = getattr(request, "_graphql_trace", False)
+        if trace is False:
+            trace = _start_trace(request)
+        if trace is None:
+            return next(root, info, **args)
+
+        counter = _QueryCounter()
+        started = time.perf_counter()
+        try:
+            # Every alias, since query operations may read from a replica
+            with ExitStack() as stack:
+                for database in connections.all():
+                    stack.enter_context(database.execute_wrapper(counter))
+                result = next(root, info, **args)
+                if isinstance(result, QuerySet):
+                    # A lazy QuerySet would run its SQL later, while graphql
+                    # completes the list, outside this counter. len() fills
+                    # its result cache, which the completion then reuses.
+                    len(result)
+                return result
+        finally:
+            path = ".".join(str(key) for key in info.path.as_list() if not isinstance(key, int))
+            trace.record(path, time.perf_counter() - started, counter.count, counter.duration)
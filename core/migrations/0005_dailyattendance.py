@@ -0,0 +1,38 @@
+# Generated by Django 5.1.3 on 2026-10-17 23:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_attendance(apps, schema_editor):
+    Workout = apps.get_model('core', 'Workout')
+    DailyAttendance = apps.get_model('core', 'DailyAttendance')
+    rows = Workout.objects.values('user_id', 'sport_id', 'date').annotate(workout_count=Count('id')).order_by()
+    DailyAttendance.objects.bulk_create((DailyAttendance(**row) for row in rows.iterator()), batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_alter_workout_date'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyAttendance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('workout_count', models.PositiveIntegerField(default=0)),
+                ('sport', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.sport')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'sport', 'date'), name='unique_daily_attendance')],
+            },
+        ),
+        migrations.RunPython(backfill_attendance, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.1.3 on 2026-10-17 23:55
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_personal_records(apps, schema_editor):
+    WorkoutDetail = apps.get_model('core', 'WorkoutDetail')
+    PersonalRecord = apps.get_model('core', 'PersonalRecord')
+    rows = (
+        WorkoutDetail.objects.filter(reps__isnull=False, weight__isnull=False)
+        .values_list('workout__user_id', 'exercise_id', 'reps', 'weight', 'workout__date')
+        .order_by('workout__user_id', 'exercise_id', 'reps', '-weight', 'workout__date')
+    )
+    records = {}
+    for user_id, exercise_id, reps, weight, date in rows.iterator():
+        records.setdefault((user_id, exercise_id, reps), (weight, date))
+    PersonalRecord.objects.bulk_create(
+        [
+            PersonalRecord(user_id=user_id, exercise_id=exercise_id, reps=reps, max_weight=weight, achieved_on=date)
+            for (user_id, exercise_id, reps), (weight, date) in records.items()
+        ],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_dailyattendance'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PersonalRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reps', models.PositiveIntegerField()),
+                ('max_weight', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('achieved_on', models.DateField()),
+                ('exercise', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.exercise')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'exercise', 'reps'), name='unique_personal_record')],
+            },
+        ),
+        migrations.RunPython(backfill_personal_records, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.3 on 2026-10-18 00:01
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_personalrecord'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='workout',
+            index=models.Index(fields=['user', '-date', '-id'], name='workout_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workout',
+            index=models.Index(fields=['sport', 'date'], name='workout_sport_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workoutdetail',
+            index=models.Index(fields=['exercise', 'reps', 'weight'], name='detail_exercise_reps_idx'),
+        ),
+    ]
@@ -40,6 +40,15 @@ class Workout(models.Model):
     duration = models.PositiveIntegerField(null=True)
     location = models.ForeignKey(Location, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
+
+    class Meta:
+        indexes = [
+            # A user's history, newest first (allWorkouts, cursor pages, export)
+            models.Index(fields=['user', '-date', '-id'], name='workout_user_date_idx'),
+            # Per-sport date ranges (attendance counters)
+            models.Index(fields=['sport', 'date'], name='workout_sport_date_idx'),
+        ]
+
     def __str__(self):
         return f"{self.date} - {self.sport}"
 
@@ -53,8 +62,47 @@ class WorkoutDetail(models.Model):
     distance = models.PositiveIntegerField(null=True, blank=True)
     duration = models.PositiveIntegerField(null=True, blank=True)
     order = models.PositiveIntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Best weight per rep count of an exercise (personal records)
+            models.Index(fields=['exercise', 'reps', 'weight'], name='detail_exercise_reps_idx'),
+        ]
+
     def __str__(self):
         return f"Workout Details: {self.exercise.name} - {self.workout.date} - Order {self.order}"
-    
-    
 
+
+class DailyAttendance(models.Model):
+    # Rollup of Workout by (user, sport, date), kept in sync by core.rollups so
+    # attendance counters read a handful of rows instead of scanning Workout.
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    sport = models.ForeignKey(Sport, on_delete=models.CASCADE)
+    date = models.DateField()
+    workout_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'sport', 'date'], name='unique_daily_attendance'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.sport} - {self.date}"
+
+
+class PersonalRecord(models.Model):
+    # Heaviest weight per (user, exercise, reps), kept in sync by core.rollups
+    # so maxWeightPerReps is an indexed lookup instead of a GROUP BY over details.
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    exercise = models.ForeignKey(Exercise, on_delete=models.CASCADE)
+    reps = models.PositiveIntegerField()
+    max_weight = models.DecimalField(max_digits=5, decimal_places=2)
+    achieved_on = models.DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'exercise', 'reps'], name='unique_personal_record'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.exercise} - {self.reps} x {self.max_weight}"
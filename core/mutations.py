@@ -31,8 +31,13 @@ from .models import User
 from graphql_jwt.exceptions import PermissionDenied
 from graphql_jwt.utils import jwt_decode
 import logging
-import jwt 
-from django.conf import settings
+from .auth import authenticate_request, get_authenticated_user
+from . import catalog
+from .loaders import get_loaders
+from .rollups import refresh_attendance, refresh_personal_records
+
+
+DETAIL_FIELDS = ["exercise", "reps", "weight", "calories", "distance", "duration", "order"]
 
 
 # Create User Mutation
@@ -90,45 +95,21 @@ class VerifyToken(graphene.Mutation):
         pass  # No need for token argument
 
     def mutate(self, info):
-        headers = info.context.META
-        auth_header = headers.get('HTTP_AUTHORIZATION', None)
-
-        if auth_header:
-            # Extract the token from the 'Authorization' header
-            token = auth_header.split()[1]
-            try:
-                # Decode the token to get the payload
-                decoded_token = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
-                logging.info(f"Decoded Token: {decoded_token}")
-
-                # Get the username from the token payload
-                username = decoded_token.get("username")
-                if not username:
-                    raise GraphQLError("Invalid token: Username not found.")
-
-                # Retrieve the user based on the username
-                try:
-                    user = get_user_model().objects.get(username=username)
-                    info.context.user = user  # Set the user in context for authorization
-                except get_user_model().DoesNotExist:
-                    logging.error("User not found for decoded username")
-                    return VerifyToken(is_valid=False)
-
-                # If successful, return the user and is_valid = True
-                return VerifyToken(is_valid=True, user=user)
-
-            except jwt.ExpiredSignatureError:
-                logging.warning("Token has expired.")
-                raise GraphQLError("Token has expired.")
-            except jwt.InvalidTokenError:
-                logging.warning("Invalid token.")
-                raise GraphQLError("Invalid token.")
-            except Exception as e:
-                # Log any other exceptions for debugging
-                logging.error(f"Error verifying token: {str(e)}")
-                return VerifyToken(is_valid=False)
-        else:
-            raise GraphQLError("Authorization header is missing.")
+        auth = authenticate_request(info.context)
+
+        if auth.reason == "no_user":
+            logging.error("User not found for decoded username")
+            return VerifyToken(is_valid=False)
+        if auth.reason in ("no_username", "malformed_header"):
+            # A token without a username or a header without a token is
+            # reported as not valid rather than as an error
+            logging.error(f"Error verifying token: {auth.error}")
+            return VerifyToken(is_valid=False)
+        if auth.error:
+            logging.warning(auth.error)
+            raise GraphQLError(auth.error)
+
+        return VerifyToken(is_valid=True, user=auth.user)
         
 class CreateLocation(graphene.Mutation):
     location = graphene.Field(LocationType)
@@ -139,6 +120,7 @@ class CreateLocation(graphene.Mutation):
     def mutate(self, info, name):
         location = Location(name=name)
         location.save()
+        catalog.invalidate(Location)
         return CreateLocation(location=location)
 
 
@@ -151,6 +133,7 @@ class CreateSport(graphene.Mutation):
     def mutate(self, info, name):
         sport = Sport(name=name)
         sport.save()
+        catalog.invalidate(Sport)
         return CreateSport(sport=sport)
 
 
@@ -163,6 +146,7 @@ class CreateWorkoutCategory(graphene.Mutation):
     def mutate(self, info, name):
         workout_category = WorkoutCategory(name=name)
         workout_category.save()
+        catalog.invalidate(WorkoutCategory)
         return CreateWorkoutCategory(workout_category=workout_category)
 
 
@@ -176,6 +160,7 @@ class CreateExercise(graphene.Mutation):
     def mutate(self, info, name, description=""):
         exercise = Exercise(name=name, description=description)
         exercise.save()
+        catalog.invalidate(Exercise)
         return CreateExercise(exercise=exercise)
 
 
@@ -202,34 +187,10 @@ class CreateWorkout(graphene.Mutation):
         workout_details_input=None,
     ):
         with transaction.atomic():
-            headers = info.context.META 
-            auth_header = headers.get('HTTP_AUTHORIZATION', None) 
-            if auth_header: 
-                token = auth_header.split()[1] 
-                try: 
-                    payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"]) 
-                    username = payload.get('username') 
-                    if not username: 
-                        raise GraphQLError("Invalid token.") 
-                    try: 
-                        user = User.objects.get(username=username) 
-                        info.context.user = user 
-                    except User.DoesNotExist: 
-                        raise GraphQLError("User does not exist.")
-                except jwt.ExpiredSignatureError: 
-                    raise GraphQLError("Token has expired.") 
-                except jwt.InvalidTokenError: 
-                    raise GraphQLError("Invalid token.") 
-            else: 
-                raise GraphQLError("Authorization header is missing.") 
-            user = info.context.user 
-            if not user.is_authenticated: 
-                raise GraphQLError("You must be logged in to create workouts.") 
-            sport, _ = Sport.objects.get_or_create(name=sport_name)
-            location, _ = Location.objects.get_or_create(name=location_name)
-            workout_category, _ = WorkoutCategory.objects.get_or_create(
-                name=workout_category_name
-            )
+            user = get_authenticated_user(info, "You must be logged in to create workouts.")
+            sport = catalog.get_or_create_by_name(Sport, sport_name)
+            location = catalog.get_or_create_by_name(Location, location_name)
+            workout_category = catalog.get_or_create_by_name(WorkoutCategory, workout_category_name)
             workout = Workout(
                 user=user,
                 date=date,
@@ -239,27 +200,29 @@ class CreateWorkout(graphene.Mutation):
                 location=location,
             )
             workout.save()
+            refresh_attendance(user.id, [(workout.sport_id, workout.date)])
             workout_details = []
             if workout_details_input:
-                for detail in workout_details_input:
-                    exercise, _ = Exercise.objects.get_or_create(
-                        name=detail.exercise_name
-                    )
-                    weight = (
-                        Decimal(detail.weight) if detail.weight is not None else None
-                    )
-                    workout_detail = WorkoutDetail(
+                exercises = catalog.get_or_create_exercises(
+                    detail.exercise_name for detail in workout_details_input
+                )
+                workout_details = WorkoutDetail.objects.bulk_create([
+                    WorkoutDetail(
                         workout=workout,
-                        exercise=exercise,
+                        exercise=exercises[detail.exercise_name],
                         reps=detail.reps,
-                        weight=weight,
+                        weight=Decimal(detail.weight) if detail.weight is not None else None,
                         calories=detail.calories,
                         distance=detail.distance,
                         duration=detail.duration,
                         order=detail.order,
                     )
-                    workout_detail.save()
-                    workout_details.append(workout_detail)
+                    for detail in workout_details_input
+                ])
+                refresh_personal_records(
+                    user.id, {(detail.exercise_id, detail.reps) for detail in workout_details}
+                )
+                get_loaders(info.context).prime_details(workout_details)
             return CreateWorkout(workout=workout, workout_details=workout_details)
 
 
@@ -281,91 +244,119 @@ class UpdateWorkout(graphene.Mutation):
         self,
         info,
         workout_id,
-        date,
-        sport_name,
-        workout_category_name,
-        location_name,
+        date=None,
+        sport_name=None,
+        workout_category_name=None,
+        location_name=None,
         duration=None,
         workout_details_input=None,
     ):
-        headers = info.context.META 
-        auth_header = headers.get('HTTP_AUTHORIZATION', None) 
-        if auth_header: 
-            token = auth_header.split()[1] 
-            try: 
-                payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"]) 
-                username = payload.get('username') 
-                if not username: 
-                    raise GraphQLError("Invalid token.") 
-                try: 
-                    user = User.objects.get(username=username) 
-                    info.context.user = user 
-                except User.DoesNotExist: 
-                    raise GraphQLError("User does not exist.")
-            except jwt.ExpiredSignatureError: 
-                raise GraphQLError("Token has expired.") 
-            except jwt.InvalidTokenError: 
-                raise GraphQLError("Invalid token.") 
-        else: 
-            raise GraphQLError("Authorization header is missing.") 
-        user = info.context.user 
-        if not user.is_authenticated: 
-            raise GraphQLError("You must be logged in to update workouts.") 
-        try:
-            workout = Workout.objects.get(id=workout_id)
-        except Workout.DoesNotExist:
-            raise Exception("Workout not found")
-        if date:
-            workout.date = date
-        if duration is not None:
-            workout.duration = duration
-        if sport_name:
-            sport, _ = Sport.objects.get_or_create(name=sport_name)
-            workout.sport = sport
-        if workout_category_name:
-            workout_category, _ = WorkoutCategory.objects.get_or_create(name=workout_category_name)
-            workout.workout_category = workout_category
-        if location_name:
-            location, _ = Location.objects.get_or_create(name=location_name)
-            workout.location = location
-        workout.save()
-
-        # Handling workout details
-        workout_details = []
-        existing_detail_ids = {detail.id for detail in workout.details.all()}
-
-        # Track provided IDs for update/delete operations
-        input_detail_ids = set()
-        
-        if workout_details_input:
-            for detail in workout_details_input:
-                if detail.id:  # Update existing detail
-                    try:
-                        workout_detail = WorkoutDetail.objects.get(id=detail.id, workout=workout)
-                    except WorkoutDetail.DoesNotExist:
-                        raise Exception("Workout detail not found")
-                    input_detail_ids.add(detail.id)  # Track this ID for update
-                else:  # Create new detail
-                    workout_detail = WorkoutDetail(workout=workout)
-
-                # Update detail fields
-                exercise, _ = Exercise.objects.get_or_create(name=detail.exercise_name)
-                workout_detail.exercise = exercise
-                workout_detail.reps = detail.reps
-                workout_detail.weight = Decimal(detail.weight) if detail.weight is not None else None
-                workout_detail.calories = detail.calories
-                workout_detail.distance = detail.distance
-                workout_detail.duration = detail.duration
-                workout_detail.order = detail.order
-                workout_detail.save()
-                workout_details.append(workout_detail)
+        with transaction.atomic():
+            user = get_authenticated_user(info, "You must be logged in to update workouts.")
+            try:
+                workout = Workout.objects.select_for_update().get(id=workout_id)
+            except Workout.DoesNotExist:
+                raise Exception("Workout not found")
+            previous_attendance_key = (workout.sport_id, workout.date)
+            if date:
+                workout.date = date
+            if duration is not None:
+                workout.duration = duration
+            if sport_name:
+                sport = catalog.get_or_create_by_name(Sport, sport_name)
+                workout.sport = sport
+            if workout_category_name:
+                workout_category = catalog.get_or_create_by_name(WorkoutCategory, workout_category_name)
+                workout.workout_category = workout_category
+            if location_name:
+                location = catalog.get_or_create_by_name(Location, location_name)
+                workout.location = location
+            workout.save()
+            refresh_attendance(workout.user_id, [previous_attendance_key, (workout.sport_id, workout.date)])
+
+            # Diff the input against one locked read of the current details, then
+            # write only what changed: one bulk_update, one bulk_create, one delete.
+            existing_details = {
+                detail.id: detail
+                for detail in WorkoutDetail.objects.select_for_update().filter(workout=workout)
+            }
+            previous_record_keys = {(detail.exercise_id, detail.reps) for detail in existing_details.values()}
+            workout_details = []
+            details_to_update = []
+            details_to_create = []
+            input_detail_ids = set()
 
-        
-        details_to_delete = existing_detail_ids - input_detail_ids
-        if details_to_delete:
-            WorkoutDetail.objects.filter(id__in=details_to_delete).delete()
+            if workout_details_input:
+                exercises = catalog.get_or_create_exercises(
+                    detail.exercise_name for detail in workout_details_input
+                )
+                for detail in workout_details_input:
+                    values = {
+                        "exercise_id": exercises[detail.exercise_name].id,
+                        "reps": detail.reps,
+                        "weight": Decimal(detail.weight) if detail.weight is not None else None,
+                        "calories": detail.calories,
+                        "distance": detail.distance,
+                        "duration": detail.duration,
+                        "order": detail.order,
+                    }
+                    if detail.id:  # Update existing detail
+                        try:
+                            workout_detail = existing_details[int(detail.id)]
+                        except (KeyError, ValueError):
+                            raise Exception("Workout detail not found")
+                        input_detail_ids.add(workout_detail.id)
+                        changed = False
+                        for field, value in values.items():
+                            if getattr(workout_detail, field) != value:
+                                setattr(workout_detail, field, value)
+                                changed = True
+                        if changed:
+                            details_to_update.append(workout_detail)
+                    else:  # Create new detail
+                        workout_detail = WorkoutDetail(workout=workout, **values)
+                        details_to_create.append(workout_detail)
+                    workout_details.append(workout_detail)
+
+            if details_to_update:
+                WorkoutDetail.objects.bulk_update(details_to_update, DETAIL_FIELDS)
+            if details_to_create:
+                WorkoutDetail.objects.bulk_create(details_to_create)
+
+            details_to_delete = existing_details.keys() - input_detail_ids
+            if details_to_delete:
+                WorkoutDetail.objects.filter(id__in=details_to_delete).delete()
+
+            # Edits, deletes and a changed date can all move a record, so refresh
+            # every key the workout touched before and after the change.
+            refresh_personal_records(
+                workout.user_id,
+                previous_record_keys | {(detail.exercise_id, detail.reps) for detail in workout_details},
+            )
+            get_loaders(info.context).prime_details(workout_details)
 
-        return UpdateWorkout(workout=workout, workout_details=workout_details)
+            return UpdateWorkout(workout=workout, workout_details=workout_details)
+
+
+class DeleteWorkout(graphene.Mutation):
+    ok = graphene.Boolean()
+
+    class Arguments:
+        workout_id = graphene.ID(required=True)
+
+    def mutate(self, info, workout_id):
+        with transaction.atomic():
+            user = get_authenticated_user(info, "You must be logged in to delete workouts.")
+            try:
+                workout = Workout.objects.select_for_update().get(id=workout_id, user=user)
+            except Workout.DoesNotExist:
+                raise Exception("Workout not found")
+            attendance_key = (workout.sport_id, workout.date)
+            record_keys = set(workout.details.values_list('exercise_id', 'reps'))
+            workout.delete()
+            refresh_attendance(user.id, [attendance_key])
+            refresh_personal_records(user.id, record_keys)
+            return DeleteWorkout(ok=True)
 
 
 class Mutation(graphene.ObjectType):
@@ -375,6 +366,7 @@ class Mutation(graphene.ObjectType):
     create_exercise = CreateExercise.Field()
     create_workout = CreateWorkout.Field()
     update_workout = UpdateWorkout.Field()
+    delete_workout = DeleteWorkout.Field()
     create_user = CreateUser.Field()
     login = Login.Field()
     verify_token = VerifyToken.Field()
@@ -0,0 +1,72 @@
+import base64
+import datetime
+from django.conf import settings
+from django.db.models import Q
+from graphql import GraphQLError
+
+
+# Page sizes used when a client omits the limit. Declared as the arguments'
+# default values too, so the cost estimate (core.cost) prices the same size.
+DEFAULT_PAGE_SIZE = 10
+DEFAULT_CONNECTION_SIZE = 50
+# Points of a downsampled history (estimated1RMHistory)
+DEFAULT_HISTORY_POINTS = 100
+
+
+def unbounded_list_size():
+    # Rows a root list without a limit argument returns at most; core.cost
+    # prices such lists at the same size
+    return getattr(settings, 'GRAPHQL_UNBOUNDED_LIST_SIZE', 1000)
+
+
+def clamp_limit(limit, default=DEFAULT_PAGE_SIZE):
+    # Page sizes are capped so a single request cannot ask for a whole table
+    return max(min(limit or default, getattr(settings, 'GRAPHQL_MAX_PAGE_SIZE', 100)), 1)
+
+
+def encode_cursor(*values):
+    raw = "|".join(value.isoformat() if isinstance(value, datetime.date) else str(value) for value in values)
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor, *parsers):
+    try:
+        # Only the last value may itself contain the separator (e.g. a name)
+        parts = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", len(parsers) - 1)
+        if len(parts) != len(parsers):
+            raise ValueError(cursor)
+        return [parse(part) for parse, part in zip(parsers, parts)]
+    except (ValueError, UnicodeError):
+        raise GraphQLError("Invalid cursor.")
+
+
+def keyset_queryset(queryset, ordering, limit, after=None, descending=True):
+    # Seek pagination: rows are ordered by a unique key and the next page starts
+    # strictly after the last key seen, so no COUNT(*) and no OFFSET scan.
+    # `ordering` is a list of (field, parser) pairs. One extra row is fetched
+    # to tell whether another page follows.
+    fields = [field for field, _ in ordering]
+    direction, lookup = ("-", "__lt") if descending else ("", "__gt")
+    queryset = queryset.order_by(*[direction + field for field in fields])
+
+    if after:
+        values = decode_cursor(after, *[parser for _, parser in ordering])
+        condition = Q()
+        for index, field in enumerate(fields):
+            # (a, b) < (x, y)  <=>  a < x OR (a = x AND b < y)
+            step = Q(**{field + lookup: values[index]})
+            for previous, value in zip(fields[:index], values[:index]):
+                step &= Q(**{previous: value})
+            condition |= step
+        queryset = queryset.filter(condition)
+    return queryset[:limit + 1]
+
+
+def keyset_page(queryset, ordering, limit, after=None, descending=True):
+    # One page of keyset_queryset: (rows, end cursor, has next page)
+    fields = [field for field, _ in ordering]
+    rows = list(keyset_queryset(queryset, ordering, limit, after, descending))
+    has_next_page = len(rows) > limit
+    rows = rows[:limit]
+    end_cursor = encode_cursor(*[getattr(rows[-1], field) for field in fields]) if rows else None
+    return rows, end_cursor, has_next_page
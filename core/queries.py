@@ -1,27 +1,105 @@
 import graphene
-from .types import LocationType, SportType, WorkoutCategoryType, ExerciseType, WorkoutDetailType, WorkoutPaginationType, WorkoutType, UserType
-from .models import Location, Sport, WorkoutCategory, Exercise, Workout, WorkoutDetail, User
+from .types import LocationType, SportType, WorkoutCategoryType, ExerciseType, WorkoutDetailType, WorkoutPaginationType, WorkoutCursorPaginationType, WorkoutType, UserType, AttendanceSummaryType
+from .types import WorkoutDetailConnectionType, UserConnectionType, ExerciseConnectionType, TrainingVolumeType, VolumeBucket, EstimatedOneRepMaxType
+from .models import Location, Sport, WorkoutCategory, Exercise, Workout, WorkoutDetail, User, DailyAttendance, PersonalRecord
+from . import catalog
+from .loaders import get_loaders
+from .pagination import DEFAULT_CONNECTION_SIZE, DEFAULT_HISTORY_POINTS, DEFAULT_PAGE_SIZE, clamp_limit, keyset_page, unbounded_list_size
+from .auth import get_authenticated_user
 from graphql import GraphQLError 
 import datetime
-import jwt 
-from django.conf import settings
 from collections import defaultdict
-from django.db.models import Max
+from django.db.models import Case, Count, DecimalField, ExpressionWrapper, F, FloatField, Max, Q, Sum, When
+from django.db.models.functions import Cast, Lower, TruncMonth, TruncWeek
 from django.core.paginator import Paginator
 
 
+def group_workouts_by_date(workouts):
+    # Group workouts by date, newest first
+    grouped_workouts = defaultdict(list)
+    for workout in workouts:
+        grouped_workouts[workout.date].append(workout)
+
+    return [
+        {"date": date, "workouts": grouped_workouts[date]}
+        for date in sorted(grouped_workouts.keys(), reverse=True)
+    ]
+
+
+# The querysets behind the hot resolvers. core/tests.py checks their query
+# plans, so an index they depend on cannot silently stop being used.
+WORKOUT_CURSOR = [('date', datetime.date.fromisoformat), ('id', int)]
+
+
+def workout_history(user):
+    # A user's workouts, newest first (workout_user_date_idx)
+    return Workout.objects.filter(user=user).order_by('-date')
+
+
+def attendance_summary_rows(user, sports=None, today=None):
+    # One conditional-aggregation query over the DailyAttendance rollup (one
+    # row per user, sport and day) counts this week, last week and all time
+    # for every requested sport at once. Case variants of a sport name
+    # ("Yoga", "yoga") share a group, so days are counted distinct.
+    today = today or datetime.date.today()
+    monday = today - datetime.timedelta(days=today.weekday())
+    last_monday = monday - datetime.timedelta(days=7)
+    last_sunday = monday - datetime.timedelta(days=1)
+
+    days = DailyAttendance.objects.filter(user=user).annotate(sport_key=Lower('sport__name'))
+    if sports:
+        days = days.filter(sport_key__in=[sport.lower() for sport in sports])
+    return days.values('sport_key').annotate(
+        sport=Max('sport__name'),
+        this_week_count=Count('date', distinct=True, filter=Q(date__gte=monday, date__lte=today)),
+        last_week_count=Count('date', distinct=True, filter=Q(date__gte=last_monday, date__lte=last_sunday)),
+        total_count=Count('date', distinct=True),
+    )
+
+
+def personal_records(user, exercise):
+    # Records are maintained per user by core.rollups, so this is an indexed
+    # lookup on (user, exercise) instead of a GROUP BY over every detail row
+    return PersonalRecord.objects.filter(user=user, exercise=exercise).order_by('reps')
+
+
 class MaxWeightPerReps(graphene.ObjectType):
         reps = graphene.Int()
         max_weight = graphene.Float()
+        achieved_on = graphene.Date()
 
 
 class Query(graphene.ObjectType):
     all_locations = graphene.List(LocationType)
     all_sports = graphene.List(SportType)
     all_workout_categories = graphene.List(WorkoutCategoryType)
-    all_exercises = graphene.List(ExerciseType)
-    all_workouts = graphene.Field(WorkoutPaginationType, limit=graphene.Int(), offset=graphene.Int())
-    all_workout_details = graphene.List(WorkoutDetailType)
+    all_exercises = graphene.List(ExerciseType, deprecation_reason="Use exercisesPage.")
+    all_workouts = graphene.Field(WorkoutPaginationType, limit=graphene.Int(default_value=DEFAULT_PAGE_SIZE), offset=graphene.Int())
+    all_workouts_cursor = graphene.Field(
+        WorkoutCursorPaginationType, limit=graphene.Int(default_value=DEFAULT_PAGE_SIZE), after=graphene.String()
+    )
+    all_workout_details = graphene.List(WorkoutDetailType, deprecation_reason="Use workoutDetailsPage.")
+    workout_details_page = graphene.Field(
+        WorkoutDetailConnectionType,
+        first=graphene.Int(default_value=DEFAULT_CONNECTION_SIZE),
+        after=graphene.String(),
+        workout_id=graphene.ID(),
+        exercise_name=graphene.String(),
+        date_from=graphene.Date(),
+        date_to=graphene.Date(),
+    )
+    users_page = graphene.Field(
+        UserConnectionType,
+        first=graphene.Int(default_value=DEFAULT_CONNECTION_SIZE),
+        after=graphene.String(),
+        username=graphene.String(),
+    )
+    exercises_page = graphene.Field(
+        ExerciseConnectionType,
+        first=graphene.Int(default_value=DEFAULT_CONNECTION_SIZE),
+        after=graphene.String(),
+        name=graphene.String(),
+    )
 
     location = graphene.Field(LocationType, id=graphene.Int(required=True))
     sport = graphene.Field(SportType, id=graphene.Int(required=True))
@@ -35,14 +113,31 @@ class Query(graphene.ObjectType):
     swimming_attendance_count = graphene.Int()
     swimming_attendance_last_week_count = graphene.Int()
     swimming_attendance_total_count = graphene.Int()
-    users = graphene.List(UserType)
+    attendance_summary = graphene.List(AttendanceSummaryType, sports=graphene.List(graphene.String))
+    users = graphene.List(UserType, deprecation_reason="Use usersPage.")
     max_weight_per_reps = graphene.List(
         MaxWeightPerReps, 
         exercise_name=graphene.String(required=True)
     )
+    training_volume = graphene.List(
+        TrainingVolumeType,
+        exercise=graphene.String(),
+        date_from=graphene.Date(name="from"),
+        date_to=graphene.Date(name="to"),
+        bucket=VolumeBucket(default_value=VolumeBucket.WEEK.value),
+    )
+    estimated_1rm_history = graphene.List(
+        EstimatedOneRepMaxType,
+        name="estimated1RMHistory",
+        exercise_name=graphene.String(required=True),
+        date_from=graphene.Date(name="from"),
+        date_to=graphene.Date(name="to"),
+        max_points=graphene.Int(default_value=DEFAULT_HISTORY_POINTS),
+    )
 
     def resolve_users(self, info):
-        return User.objects.all()
+        # Capped at the size the cost estimate assumes for it
+        return User.objects.order_by('id')[:unbounded_list_size()]
     
     def resolve_crossfit_attendance_count(self, info):
         # Get today's date
@@ -54,7 +149,7 @@ class Query(graphene.ObjectType):
      
         
         # Filter workouts for the current week and category, counting unique dates only
-        unique_days_this_week = Workout.objects.filter(
+        unique_days_this_week = DailyAttendance.objects.filter(
             sport__name__iexact="CrossFit",
             date__gte=monday,
             date__lte=today
@@ -73,7 +168,7 @@ class Query(graphene.ObjectType):
        
         
         # Filter workouts for last week, counting unique dates only
-        unique_days_last_week = Workout.objects.filter(
+        unique_days_last_week = DailyAttendance.objects.filter(
             sport__name__iexact="CrossFit",
             date__gte=last_monday,
             date__lte=last_sunday
@@ -87,7 +182,7 @@ class Query(graphene.ObjectType):
     def resolve_crossfit_attendance_total_count(self, info):        
         # Get all distinct workout days for CrossFit attendance
         total_crossfit_days = (
-        Workout.objects.filter(sport__name__iexact="CrossFit")  # Case-insensitive match for "CrossFit"
+        DailyAttendance.objects.filter(sport__name__iexact="CrossFit")  # Case-insensitive match for "CrossFit"
         .values_list('date', flat=True)  # Get the distinct workout dates
         .distinct()
         .count()
@@ -109,7 +204,7 @@ class Query(graphene.ObjectType):
             return 0  # No swimming sport found
         
         # Filter workouts for the current week and category, counting unique dates only
-        unique_days_this_week = Workout.objects.filter(
+        unique_days_this_week = DailyAttendance.objects.filter(
             sport=swimming,
             date__gte=monday,
             date__lte=today
@@ -132,7 +227,7 @@ class Query(graphene.ObjectType):
             return 0  # No swimming sport found
         
         # Filter workouts for last week, counting unique dates only
-        unique_days_last_week = Workout.objects.filter(
+        unique_days_last_week = DailyAttendance.objects.filter(
             sport=swimming,
             date__gte=last_monday,
             date__lte=last_sunday
@@ -152,7 +247,7 @@ class Query(graphene.ObjectType):
         
         # Get all distinct workout days for swimming attendance
         total_swimming_days = (
-            Workout.objects.filter(sport=swimming)
+            DailyAttendance.objects.filter(sport=swimming)
             .values('date')
             .distinct()
             .count()
@@ -165,65 +260,53 @@ class Query(graphene.ObjectType):
     
     
 
+    def resolve_attendance_summary(self, info, sports=None):
+        user = get_authenticated_user(info, "You must be logged in to view attendance.")
+
+        summaries = {row['sport_key']: row for row in attendance_summary_rows(user, sports)}
+
+        if sports:
+            # Requested sports come back in request order, with zeros when there is no data
+            empty = {'this_week_count': 0, 'last_week_count': 0, 'total_count': 0}
+            rows = [{'sport': sport, **summaries.get(sport.lower(), empty)} for sport in sports]
+        else:
+            rows = sorted(summaries.values(), key=lambda row: row['sport_key'])
+
+        return [
+            AttendanceSummaryType(
+                sport=row['sport'],
+                this_week_count=row['this_week_count'],
+                last_week_count=row['last_week_count'],
+                total_count=row['total_count'],
+            )
+            for row in rows
+        ]
+
     def resolve_all_locations(self, info):
-        return Location.objects.all()
+        return catalog.all_rows(Location)
 
     def resolve_all_sports(self, info):
-        return Sport.objects.all()
+        return catalog.all_rows(Sport)
 
     def resolve_all_workout_categories(self, info):
-        return WorkoutCategory.objects.all()
+        return catalog.all_rows(WorkoutCategory)
 
     def resolve_all_exercises(self, info):
-        return Exercise.objects.all()
+        return catalog.all_rows(Exercise)
 
     def resolve_all_workouts(self, info, limit=None, offset=None):
-        headers = info.context.META
-        auth_header = headers.get('HTTP_AUTHORIZATION', None)
-        
-        if auth_header:
-            token = auth_header.split()[1]
-            
-            try:
-                payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
-                username = payload.get('username')
-                
-                if not username:
-                    raise GraphQLError("Invalid token.")
-                
-                try:
-                    user = User.objects.get(username=username)
-                    info.context.user = user
-                except User.DoesNotExist:
-                    raise GraphQLError("User does not exist.")
-            except jwt.ExpiredSignatureError:
-                raise GraphQLError("Token has expired.")
-            except jwt.InvalidTokenError:
-                raise GraphQLError("Invalid token.")
-        else:
-            raise GraphQLError("Authorization header is missing.")
-        
-        user = info.context.user
-        
-        if not user.is_authenticated:
-            raise GraphQLError("You must be logged in to view workouts.")
+        user = get_authenticated_user(info, "You must be logged in to view workouts.")
         
         # Filter and order workouts
-        workouts = Workout.objects.filter(user=user).order_by('-date')
+        workouts = workout_history(user)
         
         # Paginate workouts
-        paginator = Paginator(workouts, limit or 10)  # Default to 10 items per page if limit is None
-        page = paginator.get_page(offset // (limit or 10) + 1)
+        limit = clamp_limit(limit)  # Default to 10 items per page if limit is null
+        paginator = Paginator(workouts, limit)
+        page = paginator.get_page((offset or 0) // limit + 1)
+        workouts_on_page = get_loaders(info.context).prime_workouts(list(page.object_list))
     
-        # Group workouts by date
-        grouped_workouts = defaultdict(list)
-        for workout in page.object_list:
-            grouped_workouts[workout.date].append(workout)
-        
-        grouped_items = [
-            {"date": date, "workouts": grouped_workouts[date]}
-            for date in sorted(grouped_workouts.keys(), reverse=True)
-        ]
+        grouped_items = group_workouts_by_date(workouts_on_page)
         
         has_next_page = page.has_next()
         has_previous_page = page.has_previous()
@@ -235,9 +318,70 @@ class Query(graphene.ObjectType):
             has_previous_page=has_previous_page,
         )
 
-                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                      
+
+    def resolve_all_workouts_cursor(self, info, limit=None, after=None):
+        user = get_authenticated_user(info, "You must be logged in to view workouts.")
+        
+        # Keyset pagination on (date, id): every page is an index range scan
+        # starting after the cursor, so deep pages cost the same as the first one.
+        workouts, end_cursor, has_next_page = keyset_page(
+            workout_history(user),
+            WORKOUT_CURSOR,
+            clamp_limit(limit),
+            after,
+        )
+        get_loaders(info.context).prime_workouts(workouts)
+        
+        return WorkoutCursorPaginationType(
+            grouped_items=group_workouts_by_date(workouts),
+            end_cursor=end_cursor,
+            has_next_page=has_next_page,
+        )
+
     def resolve_all_workout_details(self, info):
-        return WorkoutDetail.objects.all()
+        # Capped at the size the cost estimate assumes for it
+        details = WorkoutDetail.objects.order_by('id')[:unbounded_list_size()]
+        return get_loaders(info.context).prime_details(list(details))
+
+    def resolve_workout_details_page(
+        self, info, first=None, after=None, workout_id=None, exercise_name=None, date_from=None, date_to=None
+    ):
+        user = get_authenticated_user(info, "You must be logged in to view workout details.")
+
+        details = WorkoutDetail.objects.filter(workout__user=user)
+        if workout_id:
+            details = details.filter(workout_id=workout_id)
+        if exercise_name:
+            details = details.filter(exercise__name=exercise_name)
+        if date_from:
+            details = details.filter(workout__date__gte=date_from)
+        if date_to:
+            details = details.filter(workout__date__lte=date_to)
+
+        items, end_cursor, has_next_page = keyset_page(details, [('id', int)], clamp_limit(first, DEFAULT_CONNECTION_SIZE), after)
+        get_loaders(info.context).prime_details(items)
+        return WorkoutDetailConnectionType(items=items, end_cursor=end_cursor, has_next_page=has_next_page)
+
+    def resolve_users_page(self, info, first=None, after=None, username=None):
+        get_authenticated_user(info, "You must be logged in to view users.")
+
+        users = User.objects.all()
+        if username:
+            users = users.filter(username__istartswith=username)
+        items, end_cursor, has_next_page = keyset_page(
+            users, [('id', int)], clamp_limit(first, DEFAULT_CONNECTION_SIZE), after, descending=False
+        )
+        return UserConnectionType(items=items, end_cursor=end_cursor, has_next_page=has_next_page)
+
+    def resolve_exercises_page(self, info, first=None, after=None, name=None):
+        exercises = Exercise.objects.all()
+        if name:
+            exercises = exercises.filter(name__istartswith=name)
+        # Exercise names are unique, so the name alone is a stable seek key
+        items, end_cursor, has_next_page = keyset_page(
+            exercises, [('name', str)], clamp_limit(first, DEFAULT_CONNECTION_SIZE), after, descending=False
+        )
+        return ExerciseConnectionType(items=items, end_cursor=end_cursor, has_next_page=has_next_page)
 
     def resolve_location(self, info, id):
         try:
@@ -280,19 +424,106 @@ class Query(graphene.ObjectType):
     
 
     def resolve_max_weight_per_reps(self, info, exercise_name):
+        user = get_authenticated_user(info, "You must be logged in to view personal records.")
+
         # Fetch the exercise by name
         try:
             exercise = Exercise.objects.get(name=exercise_name)
         except Exercise.DoesNotExist:
             raise GraphQLError(f"Exercise with name '{exercise_name}' does not exist.")
 
-        # Aggregate maximum weight for each rep count
-        max_weights = (
-            WorkoutDetail.objects.filter(exercise=exercise)
-            .values('reps')  # Group by reps
-            .annotate(max_weight=Max('weight'))  # Annotate with the maximum weight
-            .order_by('reps')  # Sort by reps (optional)
+        # Convert query results into objects compatible with the GraphQL type
+        return [
+            MaxWeightPerReps(reps=record.reps, max_weight=record.max_weight, achieved_on=record.achieved_on)
+            for record in personal_records(user, exercise)
+        ]
+
+    def resolve_training_volume(self, info, exercise=None, date_from=None, date_to=None, bucket=VolumeBucket.WEEK.value):
+        user = get_authenticated_user(info, "You must be logged in to view training volume.")
+
+        details = WorkoutDetail.objects.filter(workout__user=user)
+        if exercise:
+            try:
+                details = details.filter(exercise=Exercise.objects.get(name=exercise))
+            except Exercise.DoesNotExist:
+                raise GraphQLError(f"Exercise with name '{exercise}' does not exist.")
+        if date_from:
+            details = details.filter(workout__date__gte=date_from)
+        if date_to:
+            details = details.filter(workout__date__lte=date_to)
+
+        # Bucketed and summed in SQL: one row per week or month comes back
+        # instead of every set in the range
+        trunc = TruncMonth if bucket == VolumeBucket.MONTH.value else TruncWeek
+        rows = (
+            details.annotate(period_start=trunc('workout__date'))
+            .values('period_start')
+            .annotate(
+                tonnage=Sum(ExpressionWrapper(
+                    F('reps') * F('weight'), output_field=DecimalField(max_digits=12, decimal_places=2)
+                )),
+                sets=Count('id'),
+                total_reps=Sum('reps'),
+                calories=Sum('calories'),
+            )
+            .order_by('period_start')
+        )
+
+        return [
+            TrainingVolumeType(
+                period_start=row['period_start'],
+                tonnage=row['tonnage'] or 0,
+                sets=row['sets'],
+                reps=row['total_reps'] or 0,
+                calories=row['calories'] or 0,
+            )
+            for row in rows
+        ]
+
+    def resolve_estimated_1rm_history(self, info, exercise_name, date_from=None, date_to=None, max_points=None):
+        user = get_authenticated_user(info, "You must be logged in to view personal records.")
+
+        try:
+            exercise = Exercise.objects.get(name=exercise_name)
+        except Exercise.DoesNotExist:
+            raise GraphQLError(f"Exercise with name '{exercise_name}' does not exist.")
+
+        details = WorkoutDetail.objects.filter(
+            workout__user=user, exercise=exercise, reps__gte=1, weight__gt=0
         )
+        if date_from:
+            details = details.filter(workout__date__gte=date_from)
+        if date_to:
+            details = details.filter(workout__date__lte=date_to)
 
-        # Convert query results into objects compatible with the GraphQL type
-        return [MaxWeightPerReps(reps=entry['reps'], max_weight=entry['max_weight']) for entry in max_weights]
\ No newline at end of file
+        # Epley formula per set, weight * (1 + reps / 30), where a single rep
+        # counts as the weight itself; the database keeps each day's best set.
+        weight = Cast('weight', FloatField())
+        estimate = Case(
+            When(reps=1, then=weight),
+            default=ExpressionWrapper(weight * (1 + Cast('reps', FloatField()) / 30), output_field=FloatField()),
+            output_field=FloatField(),
+        )
+        days = list(
+            details.values_list('workout__date')
+            .annotate(best=Max(estimate))
+            .order_by('workout__date')
+        )
+
+        # Downsample to equal time buckets, keeping each bucket's best day, so a
+        # long history comes back as at most `max_points` points with its peaks
+        max_points = clamp_limit(max_points, DEFAULT_HISTORY_POINTS)
+        if len(days) > max_points:
+            first, last = days[0][0], days[-1][0]
+            width = -(-((last - first).days + 1) // max_points)
+            buckets = {}
+            for date, best in days:
+                bucket = (date - first).days // width
+                if bucket not in buckets or best > buckets[bucket][1]:
+                    buckets[bucket] = (date, best)
+            days = [buckets[bucket] for bucket in sorted(buckets)]
+
+        return [
+            EstimatedOneRepMaxType(date=date, estimated_one_rep_max=round(best, 2))
+            for date, best in days
+        ]
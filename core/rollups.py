@@ -0,0 +1,178 @@
+from django.db.models import Count, Max, Q
+from .models import DailyAttendance, PersonalRecord, Workout, WorkoutDetail
+
+
+def _workout_counts(user_id, keys):
+    # Workouts per (sport_id, date) key of one user
+    return Workout.objects.filter(
+        user_id=user_id,
+        sport_id__in={sport_id for sport_id, _ in keys},
+        date__in={date for _, date in keys},
+    ).values('sport_id', 'date').annotate(workout_count=Count('id'))
+
+
+def refresh_attendance(user_id, keys):
+    # Recompute the DailyAttendance rows for the given (sport_id, date) keys of
+    # one user from Workout. Called inside the write transaction of every path
+    # that adds, moves or removes workouts, so the rollup never drifts.
+    keys = {key for key in keys if None not in key}
+    if not keys:
+        return
+
+    counts = {
+        (row['sport_id'], row['date']): row['workout_count']
+        for row in _workout_counts(user_id, keys)
+    }
+
+    present = [
+        DailyAttendance(user_id=user_id, sport_id=sport_id, date=date, workout_count=counts[(sport_id, date)])
+        for sport_id, date in keys
+        if (sport_id, date) in counts
+    ]
+    if present:
+        DailyAttendance.objects.bulk_create(
+            present,
+            update_conflicts=True,
+            unique_fields=['user', 'sport', 'date'],
+            update_fields=['workout_count'],
+        )
+
+    stale = keys - counts.keys()
+    if stale:
+        condition = Q()
+        for sport_id, date in stale:
+            condition |= Q(sport_id=sport_id, date=date)
+        DailyAttendance.objects.filter(condition, user_id=user_id).delete()
+
+
+def rebuild_attendance(batch_size=2000):
+    # Drop and regenerate the whole rollup from Workout.
+    DailyAttendance.objects.all().delete()
+    rows = (
+        Workout.objects.values('user_id', 'sport_id', 'date')
+        .annotate(workout_count=Count('id'))
+        .order_by()
+    )
+    batch = []
+    created = 0
+    for row in rows.iterator(chunk_size=batch_size):
+        batch.append(DailyAttendance(**row))
+        if len(batch) >= batch_size:
+            DailyAttendance.objects.bulk_create(batch)
+            created += len(batch)
+            batch = []
+    if batch:
+        DailyAttendance.objects.bulk_create(batch)
+        created += len(batch)
+    return created
+
+
+def _best_weights(details):
+    # Heaviest weight per (user, exercise, reps) over `details`
+    return (
+        details.values('workout__user_id', 'exercise_id', 'reps')
+        .annotate(max_weight=Max('weight'))
+        .order_by()
+    )
+
+
+def _record_details(user_id, keys):
+    # One user's weighted sets for the given (exercise_id, reps) keys
+    return WorkoutDetail.objects.filter(
+        workout__user_id=user_id,
+        exercise_id__in={exercise_id for exercise_id, _ in keys},
+        reps__in={reps for _, reps in keys},
+        reps__isnull=False,
+        weight__isnull=False,
+    )
+
+
+def _personal_records_for(details, keys):
+    # Best weight per (user, exercise, reps) key over `details` (sets with reps
+    # and weight), plus the first day that weight was lifted. Two grouped
+    # queries, independent of history size.
+    best = {
+        (row['workout__user_id'], row['exercise_id'], row['reps']): row['max_weight']
+        for row in _best_weights(details)
+    }
+    best = {key: weight for key, weight in best.items() if key in keys}
+    if not best:
+        return []
+
+    condition = Q()
+    for (user_id, exercise_id, reps), weight in best.items():
+        condition |= Q(workout__user_id=user_id, exercise_id=exercise_id, reps=reps, weight=weight)
+    achieved = {}
+    for row in (
+        details.filter(condition)
+        .values('workout__user_id', 'exercise_id', 'reps', 'workout__date')
+        .order_by('workout__date')
+    ):
+        achieved.setdefault((row['workout__user_id'], row['exercise_id'], row['reps']), row['workout__date'])
+
+    return [
+        PersonalRecord(
+            user_id=user_id,
+            exercise_id=exercise_id,
+            reps=reps,
+            max_weight=weight,
+            achieved_on=achieved[(user_id, exercise_id, reps)],
+        )
+        for (user_id, exercise_id, reps), weight in best.items()
+    ]
+
+
+def refresh_personal_records(user_id, keys):
+    # Recompute the PersonalRecord rows for the given (exercise_id, reps) keys of
+    # one user. Called after details are written or deleted, inside the same
+    # transaction, so records lowered by an edit or delete are corrected too.
+    keys = {(user_id, exercise_id, reps) for exercise_id, reps in keys if reps is not None}
+    if not keys:
+        return
+
+    records = _personal_records_for(
+        _record_details(user_id, {(exercise_id, reps) for _, exercise_id, reps in keys}), keys,
+    )
+    if records:
+        PersonalRecord.objects.bulk_create(
+            records,
+            update_conflicts=True,
+            unique_fields=['user', 'exercise', 'reps'],
+            update_fields=['max_weight', 'achieved_on'],
+        )
+
+    stale = keys - {(record.user_id, record.exercise_id, record.reps) for record in records}
+    if stale:
+        condition = Q()
+        for _, exercise_id, reps in stale:
+            condition |= Q(exercise_id=exercise_id, reps=reps)
+        PersonalRecord.objects.filter(condition, user_id=user_id).delete()
+
+
+def rebuild_personal_records(batch_size=2000):
+    # Drop and regenerate the whole PersonalRecord table from WorkoutDetail in
+    # one ordered pass: the first row of every key is its record.
+    PersonalRecord.objects.all().delete()
+    rows = (
+        WorkoutDetail.objects.filter(reps__isnull=False, weight__isnull=False)
+        .values_list('workout__user_id', 'exercise_id', 'reps', 'weight', 'workout__date')
+        .order_by('workout__user_id', 'exercise_id', 'reps', '-weight', 'workout__date')
+    )
+    batch = []
+    created = 0
+    last_key = None
+    for user_id, exercise_id, reps, weight, date in rows.iterator(chunk_size=batch_size):
+        if (user_id, exercise_id, reps) == last_key:
+            continue
+        last_key = (user_id, exercise_id, reps)
+        batch.append(PersonalRecord(
+            user_id=user_id, exercise_id=exercise_id, reps=reps, max_weight=weight, achieved_on=date,
+        ))
+        if len(batch) >= batch_size:
+            PersonalRecord.objects.bulk_create(batch)
+            created += len(batch)
+            batch = []
+    if batch:
+        PersonalRecord.objects.bulk_create(batch)
+        created += len(batch)
+    return created
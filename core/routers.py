@@ -0,0 +1,84 @@
+import contextvars
+import random
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from graphql import OperationType
+
+from .auth import authenticate_request
+
+# Replica chosen for the operation running in this context, or None to read
+# from the primary. The default is the primary: only the GraphQL view opts a
+# query operation into replica reads, so admin, management commands and
+# mutations never see replication lag.
+_read_alias = contextvars.ContextVar("read_alias", default=None)
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias.startswith("replica_")]
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema through replication
+        return db == "default"
+
+
+def _pin_key(user):
+    return f"core:primary-pin:{user.pk}"
+
+
+def pin_to_primary(user):
+    # Read the user's own writes back: their queries skip the replicas for
+    # REPLICA_PIN_SECONDS. Called after every path that writes for a user.
+    if replica_aliases():
+        cache.set(_pin_key(user), True, timeout=getattr(settings, 'REPLICA_PIN_SECONDS', 10))
+
+
+def _request_user(request):
+    # Looked up on the primary, before any replica is selected, so a user
+    # created a moment ago still authenticates
+    auth = authenticate_request(request)
+    return None if auth.error else auth.user
+
+
+@contextmanager
+def route_operation(request, operation_ast):
+    # Run a GraphQL query operation against one replica, unless its user
+    # wrote recently; after a mutation, pin its user to the primary.
+    replicas = replica_aliases()
+    if not replicas or operation_ast is None:
+        yield
+        return
+
+    if operation_ast.operation == OperationType.MUTATION:
+        try:
+            yield
+        finally:
+            user = _request_user(request)
+            if user is not None:
+                pin_to_primary(user)
+        return
+
+    user = _request_user(request)
+    if operation_ast.operation != OperationType.QUERY or (user is not None and cache.get(_pin_key(user))):
+        yield
+        return
+
+    # One replica for the whole operation, so all its reads see the same lag
+    token = _read_alias.set(random.choice(replicas))
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
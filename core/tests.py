@@ -0,0 +1,400 @@
+import datetime
+import re
+from unittest import skipUnless
+
+import jwt
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, connections, transaction
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from graphql import get_operation_ast, parse, print_ast
+from graphql_jwt.shortcuts import get_token
+
+from core import catalog
+from core.cost import calculate_cost
+from core.models import DailyAttendance, Exercise, Location, Sport, User, Workout, WorkoutCategory, WorkoutDetail
+from core.pagination import encode_cursor, keyset_queryset
+from core.queries import WORKOUT_CURSOR, attendance_summary_rows, personal_records, workout_history
+from core.routers import _pin_key
+from core.rollups import _best_weights, _record_details, _workout_counts, refresh_attendance
+from core.schema import schema
+from core.views import _split_root_fields
+
+ALL_WORKOUTS_QUERY = """
+query ($limit: Int) {
+  allWorkouts(limit: $limit) {
+    totalCount
+    groupedItems {
+      date
+      workouts {
+        id
+        sport { name }
+        workoutCategory { name }
+        location { name }
+        user { username }
+        details { reps weight exercise { name } }
+      }
+    }
+  }
+}
+"""
+
+
+class GraphQLTestCase(TestCase):
+    # Runs documents against the schema the way the view does: one request
+    # object per execution, carrying the user's token.
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="athlete", password="password", email="athlete@example.com")
+        cls.token = get_token(cls.user)
+
+    def setUp(self):
+        self.invalidate_catalog()
+
+    def invalidate_catalog(self):
+        # The catalog snapshots are process-wide; start from a cold cache.
+        # catalog.invalidate() would also mark them written by the test's
+        # still-open transaction and bypass the cache for the whole test.
+        catalog._snapshots.clear()
+
+    def run_query(self, query, variables=None, token=None):
+        request = RequestFactory().post("/graphql/", HTTP_AUTHORIZATION=f"Bearer {token}" if token else "")
+        return schema.execute(query, context_value=request, variable_values=variables)
+
+    def execute(self, query, variables=None):
+        result = self.run_query(query, variables, token=self.token)
+        self.assertIsNone(result.errors)
+        return result.data
+
+
+class AllWorkoutsQueryCountTests(GraphQLTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        sport = Sport.objects.create(name="CrossFit")
+        category = WorkoutCategory.objects.create(name="Strength")
+        location = Location.objects.create(name="Gym")
+        exercises = [Exercise.objects.create(name=f"Exercise {n}", description="") for n in range(5)]
+        start = datetime.date(2024, 1, 1)
+        workouts = Workout.objects.bulk_create([
+            Workout(user=cls.user, date=start + datetime.timedelta(days=n), sport=sport,
+                    workout_category=category, location=location, duration=60)
+            for n in range(60)
+        ])
+        WorkoutDetail.objects.bulk_create([
+            WorkoutDetail(workout=workout, exercise=exercise, reps=5, weight=100, order=order)
+            for workout in workouts
+            for order, exercise in enumerate(exercises)
+        ])
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        # Relations are batched per page, so a bigger page costs the same
+        # number of queries: auth, count, page, users, details and one
+        # snapshot per catalog relation (sport, category, location, exercise).
+        for limit in (5, 20, 50):
+            with self.subTest(limit=limit):
+                self.invalidate_catalog()
+                with self.assertNumQueries(9):
+                    data = self.execute(ALL_WORKOUTS_QUERY, {"limit": limit})
+                workouts = [workout for group in data["allWorkouts"]["groupedItems"] for workout in group["workouts"]]
+                self.assertEqual(len(workouts), limit)
+                self.assertTrue(all(len(workout["details"]) == 5 for workout in workouts))
+
+
+class AttendanceSummaryTests(GraphQLTestCase):
+    def test_case_variant_sports_count_each_day_once(self):
+        category = WorkoutCategory.objects.create(name="Flow")
+        location = Location.objects.create(name="Studio")
+        today = datetime.date.today()
+        for name in ("Yoga", "yoga"):
+            sport = Sport.objects.create(name=name)
+            Workout.objects.create(user=self.user, date=today, sport=sport, workout_category=category, location=location)
+            refresh_attendance(self.user.id, {(sport.id, today)})
+
+        data = self.execute('{ attendanceSummary(sports: ["YOGA"]) { thisWeekCount totalCount } }')
+        self.assertEqual(data["attendanceSummary"], [{"thisWeekCount": 1, "totalCount": 1}])
+
+
+class QueryCostTests(SimpleTestCase):
+    def cost(self, query):
+        document = parse(query)
+        return calculate_cost(schema.graphql_schema, document, get_operation_ast(document)).cost
+
+    def test_omitted_limit_is_priced_at_the_field_default(self):
+        # exercisesPage returns 50 items when `first` is omitted
+        self.assertEqual(
+            self.cost("{ exercisesPage { items { name } } }"),
+            self.cost("{ exercisesPage(first: 50) { items { name } } }"),
+        )
+        self.assertEqual(
+            self.cost("{ allWorkouts { totalCount groupedItems { workouts { id } } } }"),
+            self.cost("{ allWorkouts(limit: 10) { totalCount groupedItems { workouts { id } } } }"),
+        )
+        self.assertEqual(
+            self.cost('{ estimated1RMHistory(exerciseName: "Squat") { date estimatedOneRepMax } }'),
+            self.cost('{ estimated1RMHistory(exerciseName: "Squat", maxPoints: 100) { date estimatedOneRepMax } }'),
+        )
+
+
+class UsersPageTests(GraphQLTestCase):
+    def test_requires_login(self):
+        result = self.run_query("{ usersPage { items { username } } }")
+        self.assertEqual(result.errors[0].message, "Authorization header is missing.")
+
+    def test_does_not_expose_passwords(self):
+        data = self.execute("{ usersPage { items { username } } }")
+        self.assertEqual(data["usersPage"]["items"], [{"username": "athlete"}])
+        result = self.run_query("{ usersPage { items { password } } }", token=self.token)
+        self.assertIn("Cannot query field 'password'", result.errors[0].message)
+
+
+class SplitRootFieldsTests(SimpleTestCase):
+    def split(self, query):
+        document = parse(query)
+        documents = _split_root_fields(document, get_operation_ast(document))
+        return documents and [(key, print_ast(field_document)) for key, field_document in documents]
+
+    def test_one_document_per_response_key(self):
+        documents = self.split("{ a: allSports { name } a: allSports { id } allLocations { name } }")
+        self.assertEqual([key for key, _ in documents], ["a", "allLocations"])
+        self.assertIn("a: allSports {\n    name\n  }\n  a: allSports {\n    id\n  }", documents[0][1])
+
+    def test_repeated_key_alone_is_not_split(self):
+        self.assertIsNone(self.split("{ allSports { name } allSports { id } }"))
+
+
+@skipUnless(connection.vendor in ("postgresql", "sqlite"), "Query plans are only checked on PostgreSQL and SQLite")
+class QueryPlanTests(GraphQLTestCase):
+    # EXPLAINs the querysets the hot resolvers and rollups run and fails when
+    # one scans a whole workout table or skips the index it depends on.
+
+    # Tables that grow with every logged session
+    LARGE_TABLES = (Workout._meta.db_table, WorkoutDetail._meta.db_table, DailyAttendance._meta.db_table)
+
+    def setUp(self):
+        super().setUp()
+        if connection.vendor == "postgresql":
+            # On a small or empty database the planner rightly prefers a
+            # sequential scan; discourage it so the plan shows whether a usable
+            # index exists at all. Local to the test's transaction.
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+
+    def full_scans(self, plan):
+        # PostgreSQL: "Seq Scan on core_workout"; SQLite: "SCAN core_workout"
+        # with no "USING ... INDEX" after it (an indexed scan reads the index in order).
+        if connection.vendor == "postgresql":
+            return [table for table in self.LARGE_TABLES if re.search(rf"Seq Scan on {table}\b", plan)]
+        return [table for table in self.LARGE_TABLES if re.search(rf"\bSCAN {table}\b(?! USING)", plan)]
+
+    def assertUsesIndex(self, queryset, index=None):
+        plan = queryset.explain()
+        self.assertEqual(self.full_scans(plan), [], plan)
+        if index:
+            self.assertIn(index, plan)
+
+    def test_query_plans(self):
+        today = datetime.date.today()
+        exercise = Exercise.objects.create(name="Squat", description="")
+        plans = [
+            ("allWorkouts page", workout_history(self.user)[:10], "workout_user_date_idx"),
+            (
+                "allWorkoutsCursor page",
+                keyset_queryset(workout_history(self.user), WORKOUT_CURSOR, 10, encode_cursor(today, 1000)),
+                "workout_user_date_idx",
+            ),
+            ("attendance rollup refresh", _workout_counts(self.user.id, {(1, today)}), None),
+            ("attendanceSummary", attendance_summary_rows(self.user, ["CrossFit", "Swimming"]), None),
+            ("maxWeightPerReps", personal_records(self.user, exercise), None),
+            (
+                "personal record refresh",
+                _best_weights(_record_details(self.user.id, {(exercise.id, 5)})),
+                "detail_exercise_reps_idx",
+            ),
+        ]
+        for name, queryset, index in plans:
+            with self.subTest(name):
+                self.assertUsesIndex(queryset, index)
+
+
+@override_settings(GRAPHQL_TRACE_SAMPLE_RATE=1.0, GRAPHQL_TRACE_OUTPUT="extensions", ALLOWED_HOSTS=["testserver"])
+class TracingTests(GraphQLTestCase):
+    def test_lazy_querysets_are_counted_on_their_field(self):
+        response = Client().post(
+            "/graphql/", {"query": "{ users { username } }"},
+            content_type="application/json", HTTP_AUTHORIZATION=f"Bearer {self.token}",
+        )
+        tracing = response.json()["extensions"]["tracing"]
+        resolvers = {resolver["path"]: resolver for resolver in tracing["resolvers"]}
+        self.assertEqual(resolvers["users"]["queries"], 1)
+        self.assertEqual(tracing["queries"], 1)
+
+
+class VerifyTokenTests(GraphQLTestCase):
+    QUERY = "mutation { verifyToken { isValid user { username } } }"
+
+    def test_valid_token(self):
+        data = self.execute(self.QUERY)
+        self.assertEqual(data["verifyToken"], {"isValid": True, "user": {"username": "athlete"}})
+
+    def test_token_without_username_is_not_valid(self):
+        token = jwt.encode({"sub": "athlete"}, settings.SECRET_KEY, algorithm="HS256")
+        with self.assertLogs(level="ERROR"):
+            result = self.run_query(self.QUERY, token=token)
+        self.assertIsNone(result.errors)
+        self.assertEqual(result.data["verifyToken"], {"isValid": False, "user": None})
+
+    def test_expired_token_is_an_error(self):
+        token = jwt.encode(
+            {"username": "athlete", "exp": datetime.datetime(2020, 1, 1)}, settings.SECRET_KEY, algorithm="HS256",
+        )
+        result = self.run_query(self.QUERY, token=token)
+        self.assertEqual(result.errors[0].message, "Token has expired.")
+
+
+class UpdateWorkoutTests(GraphQLTestCase):
+    QUERY = """
+    mutation ($workoutId: ID!, $details: [UpdateWorkoutDetailInputType]) {
+      updateWorkout(workoutId: $workoutId, workoutDetailsInput: $details) {
+        workoutDetails { id reps weight }
+      }
+    }
+    """
+
+    def test_existing_details_are_kept_and_only_changed_rows_written(self):
+        workout = Workout.objects.create(
+            user=self.user, date=datetime.date(2024, 1, 1),
+            sport=Sport.objects.create(name="CrossFit"),
+            workout_category=WorkoutCategory.objects.create(name="Strength"),
+            location=Location.objects.create(name="Gym"),
+        )
+        squat = Exercise.objects.create(name="Squat", description="")
+        changed = WorkoutDetail.objects.create(workout=workout, exercise=squat, reps=5, weight=100, order=1)
+        unchanged = WorkoutDetail.objects.create(workout=workout, exercise=squat, reps=3, weight=110, order=2)
+
+        # Detail ids arrive as strings (GraphQL ID)
+        details = [
+            {"id": str(changed.id), "exerciseName": "Squat", "reps": 5, "weight": 105, "order": 1},
+            {"id": str(unchanged.id), "exerciseName": "Squat", "reps": 3, "weight": 110, "order": 2},
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            data = self.execute(self.QUERY, {"workoutId": str(workout.id), "details": details})
+
+        self.assertEqual(
+            [detail["id"] for detail in data["updateWorkout"]["workoutDetails"]], [str(changed.id), str(unchanged.id)],
+        )
+        self.assertEqual(
+            sorted(WorkoutDetail.objects.filter(workout=workout).values_list("id", "weight")),
+            [(changed.id, 105), (unchanged.id, 110)],
+        )
+        table = WorkoutDetail._meta.db_table
+        updates = [query["sql"] for query in queries.captured_queries if query["sql"].startswith(f'UPDATE "{table}"')]
+        self.assertEqual(len(updates), 1)
+        self.assertRegex(updates[0], rf'WHERE "{table}"\."id" IN \({changed.id}\)$')
+        self.assertFalse(any(query["sql"].startswith(f'DELETE FROM "{table}"') for query in queries.captured_queries))
+
+
+class CatalogInvalidationTests(GraphQLTestCase):
+    def names(self):
+        return [sport.name for sport in catalog.all_rows(Sport)]
+
+    def test_snapshot_rebuilt_before_commit_is_dropped_on_commit(self):
+        stale = catalog.CatalogSnapshot(list(Sport.objects.all()))
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                catalog.get_or_create_by_name(Sport, "Rowing")
+                # Another thread rebuilds from committed rows meanwhile
+                catalog._snapshots.set(Sport._meta.label, stale)
+        self.assertEqual(self.names(), ["Rowing"])
+
+    def test_rows_of_a_rolled_back_transaction_are_not_cached(self):
+        try:
+            with transaction.atomic():
+                catalog.get_or_create_by_name(Sport, "Rowing")
+                self.assertEqual(self.names(), ["Rowing"])
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertEqual(self.names(), [])
+
+
+@override_settings(GRAPHQL_UNBOUNDED_LIST_SIZE=3)
+class UnboundedListTests(GraphQLTestCase):
+    def test_root_lists_without_a_limit_return_what_they_are_priced_at(self):
+        for n in range(4):
+            User.objects.create_user(username=f"user{n}", password="password")
+        data = self.execute("{ users { username } }")
+        self.assertEqual(len(data["users"]), 3)
+
+
+@override_settings(DATABASE_ROUTERS=["core.routers.PrimaryReplicaRouter"], REPLICA_PIN_SECONDS=60)
+class ReplicaRoutingTests(TransactionTestCase):
+    # replica_1 mirrors the test database (see settings), so these check which
+    # connection each query goes to, not replication itself. The mirror is a
+    # second connection: it only sees committed rows, hence TransactionTestCase.
+    databases = {"default", "replica_1"}
+
+    WORKOUTS_QUERY = "{ allWorkouts { totalCount } }"
+    CREATE_WORKOUT = """
+    mutation { createWorkout(date: "2024-01-01", sportName: "CrossFit", workoutCategoryName: "Strength",
+                             locationName: "Gym") { workout { id } } }
+    """
+
+    def setUp(self):
+        catalog._snapshots.clear()
+        self.user = User.objects.create_user(username="athlete", password="password")
+        self.client = Client(HTTP_AUTHORIZATION=f"Bearer {get_token(self.user)}")
+
+    def tearDown(self):
+        cache.delete(_pin_key(self.user))
+
+    def post(self, body):
+        with CaptureQueriesContext(connections["default"]) as primary, \
+                CaptureQueriesContext(connections["replica_1"]) as replica:
+            response = self.client.post("/graphql/", body, content_type="application/json")
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json(), len(primary.captured_queries), len(replica.captured_queries)
+
+    def test_query_reads_from_a_replica(self):
+        self.post({"query": self.CREATE_WORKOUT})
+        cache.delete(_pin_key(self.user))
+
+        data, primary, replica = self.post({"query": self.WORKOUTS_QUERY})
+        self.assertEqual(data["data"]["allWorkouts"]["totalCount"], 1)
+        # The user is looked up on the primary, the workouts on the replica
+        self.assertEqual((primary, replica), (1, 2))
+
+    def test_mutation_pins_its_user_to_the_primary(self):
+        data, _, replica = self.post({"query": self.CREATE_WORKOUT})
+        self.assertNotIn("errors", data)
+        self.assertEqual(replica, 0)
+        self.assertTrue(cache.get(_pin_key(self.user)))
+
+        data, primary, replica = self.post({"query": self.WORKOUTS_QUERY})
+        self.assertEqual(data["data"]["allWorkouts"]["totalCount"], 1)
+        self.assertEqual(replica, 0)
+
+    def test_query_after_a_mutation_in_the_same_batch_reads_from_the_primary(self):
+        data, primary, replica = self.post([{"query": self.CREATE_WORKOUT}, {"query": self.WORKOUTS_QUERY}])
+        self.assertEqual(data[1]["data"]["allWorkouts"]["totalCount"], 1)
+        self.assertEqual(replica, 0)
+
+    @override_settings(GRAPHQL_TRACE_SAMPLE_RATE=1.0, GRAPHQL_TRACE_OUTPUT="extensions")
+    def test_trace_counts_replica_queries(self):
+        self.post({"query": self.CREATE_WORKOUT})
+        cache.delete(_pin_key(self.user))
+
+        data, primary, replica = self.post({"query": self.WORKOUTS_QUERY})
+        # The user lookup on the primary runs before any resolver
+        tracing = data["extensions"]["tracing"]
+        self.assertEqual(replica, 2)
+        self.assertEqual(tracing["queries"], replica)
+        self.assertEqual(tracing["resolvers"][0]["path"], "allWorkouts")
+
+    def test_import_pins_its_user_to_the_primary(self):
+        body = "date,sport,workout_category,location\n2024-01-01,CrossFit,Strength,Gym\n"
+        response = self.client.post("/import/workouts/", body, content_type="text/csv")
+        self.assertEqual(response.json(), {"imported": {"workouts": 1, "details": 0}})
+        self.assertTrue(cache.get(_pin_key(self.user)))
@@ -0,0 +1,225 @@
+import csv
+import datetime
+import json
+from decimal import Decimal, InvalidOperation
+from itertools import groupby, islice
+
+from django.db import transaction
+
+from . import catalog
+from .models import Location, Sport, Workout, WorkoutCategory, WorkoutDetail
+from .rollups import refresh_attendance, refresh_personal_records
+
+# One row per workout detail, the workout's own columns repeated on each of
+# its rows. `workout` groups rows into workouts: any value works on import (an
+# id from another app, a counter) and export writes the workout id. A workout
+# without details is a single row with an empty `exercise`.
+FIELDS = [
+    "workout", "date", "sport", "workout_category", "location", "workout_duration",
+    "exercise", "reps", "weight", "calories", "distance", "duration", "order",
+]
+WORKOUT_FIELDS = ["date", "sport", "workout_category", "location", "workout_duration"]
+INTEGER_FIELDS = ["workout_duration", "reps", "calories", "distance", "duration", "order"]
+
+FORMATS = ("csv", "ndjson")
+CONTENT_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+class _Echo:
+    # csv.writer target that hands each formatted line straight back
+    def write(self, value):
+        return value
+
+
+class TransferError(Exception):
+    def __init__(self, message, line=None):
+        super().__init__(f"Line {line}: {message}" if line else message)
+        self.line = line
+        self.imported = None
+
+
+def detect_format(name=None, content_type=None):
+    # From an explicit file name or the upload's content type; CSV otherwise
+    hint = f"{name or ''} {content_type or ''}".lower()
+    if "ndjson" in hint or "jsonl" in hint or "json" in hint:
+        return "ndjson"
+    return "csv"
+
+
+def _lines(stream):
+    # Text lines from a file, an upload or a request body, read lazily
+    for line in stream:
+        yield line.decode("utf-8-sig") if isinstance(line, bytes) else line
+
+
+def read_rows(stream, format="csv"):
+    # Yields (line number, row dict) without reading the whole input
+    if format == "csv":
+        reader = csv.DictReader(_lines(stream))
+        for row in reader:
+            yield reader.line_num, row
+    elif format == "ndjson":
+        for line_number, line in enumerate(_lines(stream), 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                raise TransferError("invalid JSON", line_number)
+            if not isinstance(row, dict):
+                raise TransferError("expected a JSON object", line_number)
+            yield line_number, row
+    else:
+        raise TransferError(f"unknown format {format!r}, expected one of {', '.join(FORMATS)}")
+
+
+def _clean(line, row):
+    row = {field: row.get(field) for field in FIELDS}
+    for field, value in row.items():
+        if isinstance(value, str):
+            value = value.strip()
+        row[field] = None if value in ("", None) else value
+
+    for field in ("date", "sport", "workout_category", "location"):
+        if row[field] is None:
+            raise TransferError(f"{field} is required", line)
+    try:
+        row["date"] = datetime.date.fromisoformat(str(row["date"]))
+    except ValueError:
+        raise TransferError(f"invalid date {row['date']!r}", line)
+    for field in INTEGER_FIELDS:
+        if row[field] is not None:
+            try:
+                row[field] = int(row[field])
+            except (TypeError, ValueError):
+                raise TransferError(f"{field} must be a whole number", line)
+            if row[field] < 0:
+                raise TransferError(f"{field} cannot be negative", line)
+    if row["weight"] is not None:
+        try:
+            row["weight"] = Decimal(str(row["weight"]))
+            # WorkoutDetail.weight holds up to 999.99
+            if not row["weight"].is_finite() or not 0 <= row["weight"] < 1000:
+                raise InvalidOperation(row["weight"])
+            row["weight"] = row["weight"].quantize(Decimal("0.01"))
+        except InvalidOperation:
+            raise TransferError(f"invalid weight {row['weight']!r}", line)
+    for field in ("sport", "workout_category", "location", "exercise"):
+        if row[field] is not None:
+            row[field] = str(row[field])
+    return row
+
+
+def _workouts(rows):
+    # Consecutive rows with the same `workout` key (or, without one, the same
+    # workout columns) form one workout: yields (first line, rows) per workout.
+    def key(item):
+        line, row = item
+        if row["workout"] is not None:
+            return ("workout", str(row["workout"]))
+        return ("fields",) + tuple(row[field] for field in WORKOUT_FIELDS)
+
+    cleaned = ((line, _clean(line, row)) for line, row in rows)
+    for _, group in groupby(cleaned, key=key):
+        group = list(group)
+        yield group[0][0], [row for _, row in group]
+
+
+def _import_chunk(user, chunk):
+    sports = catalog.get_or_create_by_names(Sport, {rows[0]["sport"] for _, rows in chunk})
+    categories = catalog.get_or_create_by_names(WorkoutCategory, {rows[0]["workout_category"] for _, rows in chunk})
+    locations = catalog.get_or_create_by_names(Location, {rows[0]["location"] for _, rows in chunk})
+    exercises = catalog.get_or_create_exercises(
+        row["exercise"] for _, rows in chunk for row in rows if row["exercise"] is not None
+    )
+
+    workouts = Workout.objects.bulk_create([
+        Workout(
+            user=user,
+            date=rows[0]["date"],
+            sport=sports[rows[0]["sport"]],
+            workout_category=categories[rows[0]["workout_category"]],
+            location=locations[rows[0]["location"]],
+            duration=rows[0]["workout_duration"],
+        )
+        for _, rows in chunk
+    ])
+    details = WorkoutDetail.objects.bulk_create([
+        WorkoutDetail(
+            workout=workout,
+            exercise=exercises[row["exercise"]],
+            reps=row["reps"],
+            weight=row["weight"],
+            calories=row["calories"],
+            distance=row["distance"],
+            duration=row["duration"],
+            order=row["order"],
+        )
+        for workout, (_, rows) in zip(workouts, chunk)
+        for row in rows
+        if row["exercise"] is not None
+    ])
+
+    refresh_attendance(user.id, {(workout.sport_id, workout.date) for workout in workouts})
+    refresh_personal_records(user.id, {(detail.exercise_id, detail.reps) for detail in details})
+    return len(workouts), len(details)
+
+
+def import_workouts(user, rows, chunk_size=500):
+    # Streams (line, row) pairs into the user's history, `chunk_size` workouts
+    # per transaction, so memory stays flat however long the input is. A bad
+    # row aborts its own chunk only: the TransferError says which line, and
+    # `imported` on it counts the workouts already committed.
+    totals = {"workouts": 0, "details": 0}
+    workouts = _workouts(rows)
+    while True:
+        try:
+            chunk = list(islice(workouts, chunk_size))
+        except TransferError as e:
+            e.imported = totals
+            raise
+        if not chunk:
+            return totals
+        with transaction.atomic():
+            created_workouts, created_details = _import_chunk(user, chunk)
+        totals["workouts"] += created_workouts
+        totals["details"] += created_details
+
+
+def export_rows(user):
+    # The user's whole history in the import format, oldest first. One query
+    # joined to the details (a workout without details gives one row with an
+    # empty exercise), read through a server-side cursor where supported.
+    rows = (
+        Workout.objects.filter(user=user)
+        .order_by('date', 'id', 'details__order', 'details__id')
+        .values_list(
+            'id', 'date', 'sport__name', 'workout_category__name', 'location__name', 'duration',
+            'details__exercise__name', 'details__reps', 'details__weight', 'details__calories',
+            'details__distance', 'details__duration', 'details__order',
+        )
+    )
+    for values in rows.iterator(chunk_size=2000):
+        yield dict(zip(FIELDS, values))
+
+
+def write_csv(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(FIELDS)
+    for row in rows:
+        yield writer.writerow(
+            "" if row[field] is None else row[field].isoformat() if field == "date" else row[field]
+            for field in FIELDS
+        )
+
+
+def write_ndjson(rows):
+    for row in rows:
+        row = {field: value for field, value in row.items() if value is not None}
+        row["date"] = row["date"].isoformat()
+        if "weight" in row:
+            row["weight"] = float(row["weight"])
+        yield json.dumps(row) + "\n"
+
+
+WRITERS = {"csv": write_csv, "ndjson": write_ndjson}
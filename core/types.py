@@ -1,6 +1,7 @@
 import graphene
 from graphene_django.types import DjangoObjectType
 from .models import Location, Sport, WorkoutCategory, Exercise, Workout, WorkoutDetail, User
+from .loaders import get_loaders
 
 
 class LocationType(DjangoObjectType):
@@ -20,11 +21,36 @@ class UserType(DjangoObjectType):
         model = User
         fields = ("id", "username", "email", "password") 
 
+class PublicUserType(DjangoObjectType):
+    # Other users as listed by usersPage: never the password hash
+    class Meta:
+        model = User
+        fields = ("id", "username", "email")
+        # Workout.user keeps resolving to UserType
+        skip_registry = True
+
 class WorkoutType(DjangoObjectType):
     class Meta:
         model = Workout
         fields = ("id", "date", "sport", "workout_category", "duration", "location", "user", "details")
 
+    # Relations go through the request loaders so a page of workouts costs
+    # one query per relation instead of one per workout.
+    def resolve_sport(self, info):
+        return get_loaders(info.context).sports.load(self.sport_id)
+
+    def resolve_workout_category(self, info):
+        return get_loaders(info.context).workout_categories.load(self.workout_category_id)
+
+    def resolve_location(self, info):
+        return get_loaders(info.context).locations.load(self.location_id)
+
+    def resolve_user(self, info):
+        return get_loaders(info.context).users.load(self.user_id)
+
+    def resolve_details(self, info):
+        return get_loaders(info.context).details.load(self.id)
+
 class ExerciseType(DjangoObjectType):
     class Meta:
         model = Exercise
@@ -32,6 +58,12 @@ class ExerciseType(DjangoObjectType):
 class WorkoutDetailType(DjangoObjectType):
     class Meta:
         model = WorkoutDetail
+
+    def resolve_exercise(self, info):
+        return get_loaders(info.context).exercises.load(self.exercise_id)
+
+    def resolve_workout(self, info):
+        return get_loaders(info.context).workouts.load(self.workout_id)
         
 class CreateWorkoutDetailInputType(graphene.InputObjectType):
     exercise_name = graphene.String()
@@ -60,4 +92,45 @@ class WorkoutPaginationType(graphene.ObjectType):
     grouped_items = graphene.List(WorkoutGroupType)
     total_count = graphene.Int()
     has_next_page = graphene.Boolean()
-    has_previous_page = graphene.Boolean()
\ No newline at end of file
+    has_previous_page = graphene.Boolean()
+
+class WorkoutCursorPaginationType(graphene.ObjectType):
+    grouped_items = graphene.List(WorkoutGroupType)
+    end_cursor = graphene.String()
+    has_next_page = graphene.Boolean()
+
+class AttendanceSummaryType(graphene.ObjectType):
+    sport = graphene.String()
+    this_week_count = graphene.Int()
+    last_week_count = graphene.Int()
+    total_count = graphene.Int()
+
+class WorkoutDetailConnectionType(graphene.ObjectType):
+    items = graphene.List(WorkoutDetailType)
+    end_cursor = graphene.String()
+    has_next_page = graphene.Boolean()
+
+class UserConnectionType(graphene.ObjectType):
+    items = graphene.List(PublicUserType)
+    end_cursor = graphene.String()
+    has_next_page = graphene.Boolean()
+
+class ExerciseConnectionType(graphene.ObjectType):
+    items = graphene.List(ExerciseType)
+    end_cursor = graphene.String()
+    has_next_page = graphene.Boolean()
+
+class VolumeBucket(graphene.Enum):
+    WEEK = "week"
+    MONTH = "month"
+
+class TrainingVolumeType(graphene.ObjectType):
+    period_start = graphene.Date()
+    tonnage = graphene.Float()
+    sets = graphene.Int()
+    reps = graphene.Int()
+    calories = graphene.Int()
+
+class EstimatedOneRepMaxType(graphene.ObjectType):
+    date = graphene.Date()
+    estimated_one_rep_max = graphene.Float()
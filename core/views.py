@@ -0,0 +1,484 @@
+import contextvars
+import hashlib
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.http import HttpResponseNotAllowed, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.http.response import HttpResponseBadRequest
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.settings import graphene_settings
+from graphene_django.utils.utils import set_rollback
+from graphene_django.views import GraphQLView, HttpError
+from graphql import (
+    DocumentNode,
+    ExecutionResult,
+    FieldNode,
+    GraphQLError,
+    OperationDefinitionNode,
+    OperationType,
+    SelectionSetNode,
+    execute,
+    get_operation_ast,
+    parse,
+    validate,
+    validate_schema,
+)
+
+from .cache import LRUCache
+from . import catalog
+from .auth import authenticate_request
+from .cost import calculate_cost
+from .middleware import get_trace
+from .models import Exercise, Location, Sport, WorkoutCategory
+from .routers import pin_to_primary, route_operation
+from .transfer import (
+    CONTENT_TYPES,
+    FORMATS,
+    WRITERS,
+    TransferError,
+    detect_format,
+    export_rows,
+    import_workouts,
+    read_rows,
+)
+
+trace_logger = logging.getLogger("core.graphql")
+
+# Root fields served entirely from the catalog snapshots, which GET requests
+# can revalidate with an ETag instead of re-running
+CATALOG_FIELDS = {
+    "allSports": Sport,
+    "allLocations": Location,
+    "allWorkoutCategories": WorkoutCategory,
+    "allExercises": Exercise,
+}
+
+
+def _catalog_models(operation_ast):
+    # The catalog models an operation reads, or None when it reads anything
+    # else. Only scalar sub-fields qualify: the catalog types also expose
+    # reverse relations (sport { workoutSet }) that are not in the snapshot.
+    models = set()
+    for selection in operation_ast.selection_set.selections:
+        if not isinstance(selection, FieldNode) or selection.name.value not in CATALOG_FIELDS:
+            return None
+        for child in (selection.selection_set.selections if selection.selection_set else ()):
+            if not isinstance(child, FieldNode) or child.selection_set:
+                return None
+        models.add(CATALOG_FIELDS[selection.name.value])
+    return models
+
+
+class FitnessGraphQLView(GraphQLView):
+    # Clients send the same handful of documents over and over, and parsing plus
+    # validating them costs more than executing most of our operations. Parsed
+    # documents and their validation errors are cached by the SHA-256 of the
+    # query text, which is also the key of Apollo-style automatic persisted
+    # queries: a client can send just the hash and skip the query body entirely.
+    document_cache = LRUCache(maxsize=getattr(settings, 'GRAPHQL_DOCUMENT_CACHE_SIZE', 256))
+    persisted_queries = LRUCache(maxsize=getattr(settings, 'GRAPHQL_PERSISTED_QUERY_CACHE_SIZE', 1000))
+
+    @staticmethod
+    def get_persisted_query_hash(request, data):
+        extensions = request.GET.get("extensions") or data.get("extensions")
+        if isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except ValueError:
+                raise HttpError(HttpResponseBadRequest("Extensions are invalid JSON."))
+        persisted_query = (extensions or {}).get("persistedQuery") or {}
+        return persisted_query.get("sha256Hash")
+
+    def parse_body(self, request):
+        # A JSON array of operations is a batch: GraphQLView's batch mode runs
+        # each entry in order on this same request, so they share the request
+        # context, the cached JWT user and the loaders, and the results come
+        # back as an array in the same order. The view is instantiated per
+        # request, so switching `batch` on here only affects this request.
+        if self.get_content_type(request) == "application/json":
+            try:
+                body = json.loads(request.body.decode("utf-8"))
+            except (UnicodeError, ValueError):
+                body = None
+            if isinstance(body, list):
+                max_batch_size = getattr(settings, 'GRAPHQL_MAX_BATCH_SIZE', 20)
+                if not body:
+                    raise HttpError(HttpResponseBadRequest("Received an empty list in the batch request."))
+                if len(body) > max_batch_size:
+                    raise HttpError(HttpResponseBadRequest(
+                        f"Batch of {len(body)} operations exceeds the maximum of {max_batch_size}."
+                    ))
+                if not all(isinstance(entry, dict) for entry in body):
+                    raise HttpError(HttpResponseBadRequest("Every batch entry must be a JSON query object."))
+                self.batch = True
+                return body
+        return super().parse_body(request)
+
+    def dispatch(self, request, *args, **kwargs):
+        response = super().dispatch(request, *args, **kwargs)
+        etag = getattr(request, "_graphql_etag", None)
+        if etag is None:
+            return response
+        if getattr(request, "_graphql_not_modified", False):
+            response = HttpResponseNotModified()
+        if response.status_code in (200, 304):
+            response["ETag"] = etag
+            # Cached per client and always revalidated; the token is part of the tag
+            response["Cache-Control"] = "private, no-cache"
+            patch_vary_headers(response, ["Authorization"])
+        return response
+
+    def get_etag(self, request, query_hash, operation_ast, variables, operation_name):
+        # Weak ETag for GET queries that only read catalog lists: the document,
+        # variables and credentials, plus the version of each catalog snapshot
+        # read. A warm process answers a revalidation without touching the database.
+        if request.method.lower() != "get" or operation_ast.operation != OperationType.QUERY:
+            return None
+        models = _catalog_models(operation_ast)
+        if not models:
+            return None
+        parts = [
+            query_hash,
+            json.dumps(variables, sort_keys=True, default=str),
+            operation_name or "",
+            request.META.get("HTTP_AUTHORIZATION", ""),
+        ] + [f"{model._meta.label}:{catalog.version(model)}" for model in sorted(models, key=lambda model: model._meta.label)]
+        return 'W/"%s"' % hashlib.sha256("|".join(parts).encode()).hexdigest()[:32]
+
+    def get_response(self, request, data, show_graphiql=False):
+        # Same as GraphQLView.get_response, plus the result `extensions`
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+
+        execution_result = self.execute_graphql_request(
+            request, data, query, variables, operation_name, show_graphiql
+        )
+
+        if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+            set_rollback()
+
+        status_code = 200
+        if execution_result:
+            response = {}
+
+            if execution_result.errors:
+                set_rollback()
+                response["errors"] = [
+                    self.format_error(e) for e in execution_result.errors
+                ]
+
+            if execution_result.errors and any(
+                not getattr(e, "path", None) for e in execution_result.errors
+            ):
+                status_code = 400
+            else:
+                response["data"] = execution_result.data
+
+            if execution_result.extensions:
+                response["extensions"] = execution_result.extensions
+
+            if self.batch:
+                response["id"] = id
+                response["status"] = status_code
+
+            result = self.json_encode(request, response, pretty=show_graphiql)
+        else:
+            result = None
+
+        return result, status_code
+
+    def get_document(self, schema, query, query_hash):
+        prepared = self.document_cache.get(query_hash)
+        if prepared is None:
+            document = parse(query)
+            validation_errors = validate(
+                schema,
+                document,
+                self.validation_rules,
+                graphene_settings.MAX_VALIDATION_ERRORS,
+            )
+            prepared = (document, validation_errors)
+            self.document_cache.set(query_hash, prepared)
+        return prepared
+
+    def execute_graphql_request(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        persisted_hash = self.get_persisted_query_hash(request, data)
+        if persisted_hash and not query:
+            query = self.persisted_queries.get(persisted_hash)
+            if query is None:
+                return ExecutionResult(errors=[
+                    GraphQLError("PersistedQueryNotFound", extensions={"code": "PERSISTED_QUERY_NOT_FOUND"})
+                ])
+
+        if not query:
+            if show_graphiql:
+                return None
+            raise HttpError(HttpResponseBadRequest("Must provide query string."))
+
+        query_hash = hashlib.sha256(query.encode()).hexdigest()
+        if persisted_hash:
+            if persisted_hash != query_hash:
+                return ExecutionResult(errors=[GraphQLError("provided sha does not match query")])
+            self.persisted_queries.set(query_hash, query)
+
+        schema = self.schema.graphql_schema
+
+        schema_validation_errors = validate_schema(schema)
+        if schema_validation_errors:
+            return ExecutionResult(data=None, errors=schema_validation_errors)
+
+        try:
+            document, validation_errors = self.get_document(schema, query, query_hash)
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+
+        operation_ast = get_operation_ast(document, operation_name)
+
+        if (
+            request.method.lower() == "get"
+            and operation_ast is not None
+            and operation_ast.operation != OperationType.QUERY
+        ):
+            if show_graphiql:
+                return None
+
+            raise HttpError(
+                HttpResponseNotAllowed(
+                    ["POST"],
+                    "Can only perform a {} operation from a POST request.".format(
+                        operation_ast.operation.value
+                    ),
+                )
+            )
+
+        if validation_errors:
+            return ExecutionResult(data=None, errors=validation_errors)
+
+        # Score the operation before running it so one oversized document
+        # cannot pin a worker; the score is reported back in `extensions`.
+        extensions = {}
+        if operation_ast is not None:
+            query_cost = calculate_cost(
+                schema, document, operation_ast, variables if isinstance(variables, dict) else None
+            )
+            max_cost = getattr(settings, 'GRAPHQL_MAX_QUERY_COST', 20000)
+            max_depth = getattr(settings, 'GRAPHQL_MAX_QUERY_DEPTH', 10)
+            extensions["cost"] = {"requested": query_cost.cost, "maximum": max_cost, "depth": query_cost.depth}
+            if query_cost.cost > max_cost:
+                return ExecutionResult(errors=[GraphQLError(
+                    f"Query cost {query_cost.cost} exceeds the maximum of {max_cost}.",
+                    extensions={"code": "QUERY_TOO_EXPENSIVE"},
+                )], extensions=extensions)
+            if query_cost.depth > max_depth:
+                return ExecutionResult(errors=[GraphQLError(
+                    f"Query depth {query_cost.depth} exceeds the maximum of {max_depth}.",
+                    extensions={"code": "QUERY_TOO_DEEP"},
+                )], extensions=extensions)
+
+        if operation_ast is not None and not show_graphiql and not self.batch:
+            etag = self.get_etag(request, query_hash, operation_ast, variables, operation_name)
+            if etag is not None:
+                request._graphql_etag = etag
+                if etag in request.META.get("HTTP_IF_NONE_MATCH", ""):
+                    # dispatch() turns this into a bodiless 304
+                    request._graphql_not_modified = True
+                    return None
+
+        with route_operation(request, operation_ast):
+            result = self.execute_document(request, schema, document, operation_ast, variables, operation_name)
+        if self.batch and operation_ast is not None and operation_ast.operation == OperationType.MUTATION:
+            # Later operations of the batch must not read rows the loaders
+            # cached before this mutation wrote
+            request.__dict__.pop("_loaders", None)
+        trace = get_trace(request)
+        if trace is not None:
+            self.report_trace(request, trace, operation_ast, extensions)
+        result.extensions = {**(result.extensions or {}), **extensions} or None
+        return result
+
+    def report_trace(self, request, trace, operation_ast, extensions):
+        # Set by core.middleware.InstrumentationMiddleware on sampled requests.
+        # Cleared afterwards so each operation of a request is sampled anew.
+        del request._graphql_trace
+        tracing = trace.as_dict()
+        output = getattr(settings, 'GRAPHQL_TRACE_OUTPUT', 'log')
+        if output in ('extensions', 'both'):
+            extensions["tracing"] = tracing
+        if output in ('log', 'both'):
+            operation_name = operation_ast.name.value if operation_ast and operation_ast.name else None
+            trace_logger.info(
+                json.dumps({"operation": operation_name, **tracing}),
+                extra={"graphql_operation": operation_name, "graphql_trace": tracing},
+            )
+
+    def execute_document(self, request, schema, document, operation_ast, variables, operation_name):
+        try:
+            execute_options = {
+                "root_value": self.get_root_value(request),
+                "context_value": self.get_context(request),
+                "variable_values": variables,
+                "operation_name": operation_name,
+                "middleware": self.get_middleware(request),
+            }
+            if self.execution_context_class:
+                execute_options["execution_context_class"] = self.execution_context_class
+
+            if (
+                operation_ast is not None
+                and operation_ast.operation == OperationType.MUTATION
+                and (
+                    graphene_settings.ATOMIC_MUTATIONS is True
+                    or connection.settings_dict.get("ATOMIC_MUTATIONS", False) is True
+                )
+            ):
+                with transaction.atomic():
+                    result = execute(schema, document, **execute_options)
+                    if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+                        transaction.set_rollback(True)
+                return result
+
+            return execute(schema, document, **execute_options)
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+
+
+def _split_root_fields(document, operation_ast):
+    # One document per response key of a query, sharing the document's
+    # fragments. Fields repeating a key (`a: allSports { name } a: allSports
+    # { id }`) stay in one document so graphql merges them. Returns None when
+    # the root selection uses fragments, which would make the split ambiguous.
+    selections = operation_ast.selection_set.selections
+    if not all(isinstance(selection, FieldNode) for selection in selections):
+        return None
+    groups = {}
+    for selection in selections:
+        groups.setdefault((selection.alias or selection.name).value, []).append(selection)
+    if len(groups) < 2:
+        return None
+    fragments = [definition for definition in document.definitions if definition is not operation_ast]
+    documents = []
+    for key, fields in groups.items():
+        operation = OperationDefinitionNode(
+            operation=operation_ast.operation,
+            name=operation_ast.name,
+            variable_definitions=operation_ast.variable_definitions,
+            directives=operation_ast.directives,
+            selection_set=SelectionSetNode(selections=tuple(fields)),
+        )
+        documents.append((key, DocumentNode(definitions=(operation, *fragments))))
+    return documents
+
+
+class AsyncFitnessGraphQLView(FitnessGraphQLView):
+    # Entry point for ASGI. Django runs plain sync views on a single shared
+    # thread under ASGI, so one slow aggregate used to stall every other
+    # request. This view handles each request on a worker thread instead, and
+    # runs the independent root fields of a query concurrently, each on its own
+    # thread and database connection, merging the results in document order.
+    #
+    # Resolvers stay synchronous: the async ORM API wraps the same blocking
+    # calls in one shared thread, which would serialise them again and break
+    # the WSGI path that Vercel uses.
+    view_is_async = True
+    executor = ThreadPoolExecutor(
+        max_workers=getattr(settings, 'GRAPHQL_ASYNC_MAX_WORKERS', 8),
+        thread_name_prefix="graphql",
+    )
+
+    async def dispatch(self, request, *args, **kwargs):
+        return await sync_to_async(self.dispatch_in_thread, thread_sensitive=False)(request, *args, **kwargs)
+
+    def dispatch_in_thread(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            close_old_connections()
+
+    def execute_document(self, request, schema, document, operation_ast, variables, operation_name):
+        documents = None
+        if operation_ast is not None and operation_ast.operation == OperationType.QUERY:
+            documents = _split_root_fields(document, operation_ast)
+        if not documents:
+            return super().execute_document(request, schema, document, operation_ast, variables, operation_name)
+
+        def run(field_document):
+            try:
+                return super(AsyncFitnessGraphQLView, self).execute_document(
+                    request, schema, field_document, operation_ast, variables, operation_name
+                )
+            finally:
+                close_old_connections()
+
+        # Each field runs in a copy of this context, so it reads from the
+        # database core.routers selected for the operation
+        contexts = [contextvars.copy_context() for _ in documents]
+        results = list(self.executor.map(
+            lambda context, field_document: context.run(run, field_document),
+            contexts,
+            [field_document for _, field_document in documents],
+        ))
+
+        data = {}
+        errors = []
+        for (key, _), result in zip(documents, results):
+            data[key] = (result.data or {}).get(key)
+            errors.extend(result.errors or [])
+        return ExecutionResult(data=data, errors=errors or None)
+
+
+@csrf_exempt
+@require_POST
+def import_workouts_view(request):
+    # Bulk import into the caller's history. Accepts a multipart upload in the
+    # `file` field or the raw body, as CSV or NDJSON (see core.transfer), read
+    # line by line so a large file never sits in memory.
+    auth = authenticate_request(request)
+    if auth.error:
+        return JsonResponse({"error": auth.error}, status=401)
+
+    if request.content_type == "multipart/form-data":
+        stream = request.FILES.get("file")
+        if stream is None:
+            return JsonResponse({"error": "Upload the file in the 'file' field."}, status=400)
+        format = request.GET.get("format") or detect_format(stream.name, stream.content_type)
+    else:
+        stream = request
+        format = request.GET.get("format") or detect_format(content_type=request.content_type)
+    if format not in FORMATS:
+        return JsonResponse({"error": f"Unknown format {format!r}."}, status=400)
+
+    try:
+        imported = import_workouts(auth.user, read_rows(stream, format))
+    except TransferError as e:
+        return JsonResponse({"error": str(e), "line": e.line, "imported": e.imported}, status=400)
+    finally:
+        # Chunks before a bad line stay committed, so pin on failure too
+        pin_to_primary(auth.user)
+    return JsonResponse({"imported": imported})
+
+
+@require_GET
+def export_workouts_view(request):
+    # The caller's full history, one row per workout detail, in the import
+    # format. Rows stream from a database cursor straight into the response,
+    # so the first bytes go out at once and memory stays flat.
+    auth = authenticate_request(request)
+    if auth.error:
+        return JsonResponse({"error": auth.error}, status=401)
+
+    format = request.GET.get("format", "ndjson")
+    if format not in FORMATS:
+        return JsonResponse({"error": f"Unknown format {format!r}."}, status=400)
+
+    response = StreamingHttpResponse(WRITERS[format](export_rows(auth.user)), content_type=CONTENT_TYPES[format])
+    response["Content-Disposition"] = f'attachment; filename="workouts.{format}"'
+    return response
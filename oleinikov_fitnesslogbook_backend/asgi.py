@@ -1,5 +1,5 @@
 """
-ASGI config for oleinikov_fitnesslibrary_backend project.
+ASGI config for oleinikov_fitnesslogbook_backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
@@ -11,6 +11,7 @@ import os
 
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'oleinikov_fitnesslibrary_backend.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'oleinikov_fitnesslogbook_backend.settings')
 
+# The GraphQL endpoint for ASGI deployments is /graphql/async/ (AsyncFitnessGraphQLView)
 application = get_asgi_application()
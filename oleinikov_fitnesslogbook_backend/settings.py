@@ -10,10 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import sys
 from pathlib import Path
 from datetime import timedelta
 import dj_database_url
-from decouple import config
+from decouple import Csv, config
+from django.core.exceptions import ImproperlyConfigured
 
 # Base directory of the project
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -58,10 +60,34 @@ MIDDLEWARE = [
 GRAPHENE = {
     'SCHEMA': 'core.schema.schema',  # Path to your GraphQL schema
     'MIDDLEWARE': [
+        'core.middleware.InstrumentationMiddleware',
         'graphql_jwt.middleware.JSONWebTokenMiddleware',
     ],
 }
 
+# Per-resolver timing and SQL counts for a sample of GraphQL requests (0.0 - 1.0).
+# Sampled traces go to the response `extensions`, the `core.graphql` log, or both.
+# With DEBUG on, sending `X-GraphQL-Trace: 1` traces that request regardless.
+GRAPHQL_TRACE_SAMPLE_RATE = config('GRAPHQL_TRACE_SAMPLE_RATE', default=0.0, cast=float)
+GRAPHQL_TRACE_OUTPUT = config('GRAPHQL_TRACE_OUTPUT', default='log')  # 'extensions', 'log' or 'both'
+
+# Parsed/validated GraphQL documents and automatic persisted queries kept per process
+GRAPHQL_DOCUMENT_CACHE_SIZE = 256
+GRAPHQL_PERSISTED_QUERY_CACHE_SIZE = 1000
+
+# Most operations accepted in one batched (JSON array) request
+GRAPHQL_MAX_BATCH_SIZE = 20
+
+# Query cost limits: operations scoring above the maximum are rejected before they run
+GRAPHQL_MAX_QUERY_COST = config('GRAPHQL_MAX_QUERY_COST', default=20000, cast=int)
+GRAPHQL_MAX_QUERY_DEPTH = 10
+GRAPHQL_MAX_PAGE_SIZE = 100  # Upper bound for limit/first arguments
+GRAPHQL_UNBOUNDED_LIST_SIZE = 1000  # Rows returned, and priced, for root lists without a limit
+GRAPHQL_NESTED_LIST_SIZE = 20  # Assumed rows for nested lists such as workout details
+
+# Threads used by the ASGI GraphQL view to run root fields concurrently
+GRAPHQL_ASYNC_MAX_WORKERS = config('GRAPHQL_ASYNC_MAX_WORKERS', default=8, cast=int)
+
 AUTHENTICATION_BACKENDS = [
     'graphql_jwt.backends.JSONWebTokenBackend',
     'django.contrib.auth.backends.ModelBackend',
@@ -128,10 +154,67 @@ TEMPLATES = [
 WSGI_APPLICATION = 'oleinikov_fitnesslogbook_backend.wsgi.application'
 
 # Database configuration
+# DB_POOL_MODE controls connection reuse between requests of a warm instance:
+#   'none'        a new connection per request (the old behaviour)
+#   'persistent'  keep the connection for DB_CONN_MAX_AGE seconds, checking it
+#                 is still alive before reuse
+#   'pgbouncer'   the same, for a URL that points at PgBouncer (or a similar
+#                 pooler) in transaction mode: server-side cursors are off,
+#                 since they cannot outlive the transaction that opened them
+DB_POOL_MODE = config('DB_POOL_MODE', default='none')
+DB_CONN_MAX_AGE = config('DB_CONN_MAX_AGE', default=60, cast=int)  # Seconds; max lifetime of a reused connection
+if DB_POOL_MODE not in ('none', 'persistent', 'pgbouncer'):
+    raise ImproperlyConfigured(f"DB_POOL_MODE must be 'none', 'persistent' or 'pgbouncer', not {DB_POOL_MODE!r}.")
+
+DATABASE_OPTIONS = {
+    'conn_max_age': DB_CONN_MAX_AGE if DB_POOL_MODE != 'none' else 0,
+    'conn_health_checks': DB_POOL_MODE != 'none',
+}
 DATABASES = {
-    'default': dj_database_url.config(default=config('PG_DATABASE_URL'))
+    'default': dj_database_url.config(default=config('PG_DATABASE_URL'), **DATABASE_OPTIONS)
 }
 
+# Default cache. Per-process memory unless configured; state that must be
+# seen by every instance (the replica pin below) needs a shared backend, e.g.
+# CACHE_BACKEND=django.core.cache.backends.db.DatabaseCache with
+# CACHE_LOCATION=core_cache after `manage.py createcachetable`.
+LOCMEM_CACHE = 'django.core.cache.backends.locmem.LocMemCache'
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default=LOCMEM_CACHE),
+        'LOCATION': config('CACHE_LOCATION', default=''),
+    }
+}
+
+# Read replicas (comma-separated URLs). GraphQL query operations read from one
+# of them; mutations, the admin and management commands use the primary. A
+# user who just wrote reads from the primary for REPLICA_PIN_SECONDS. The pin
+# lives in the default cache, and the next request may reach another instance.
+REPLICA_DATABASE_URLS = config('REPLICA_DATABASE_URLS', default='', cast=Csv())
+REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', default=10, cast=int)
+for index, url in enumerate(REPLICA_DATABASE_URLS, 1):
+    DATABASES[f'replica_{index}'] = dj_database_url.parse(url, **DATABASE_OPTIONS)
+    DATABASES[f'replica_{index}']['TEST'] = {'MIRROR': 'default'}
+if REPLICA_DATABASE_URLS:
+    if CACHES['default']['BACKEND'] == LOCMEM_CACHE:
+        raise ImproperlyConfigured(
+            "REPLICA_DATABASE_URLS needs a cache shared by all instances for the read-your-writes pin: "
+            "set CACHE_BACKEND (and CACHE_LOCATION)."
+        )
+    DATABASE_ROUTERS = ['core.routers.PrimaryReplicaRouter']
+elif sys.argv[1:2] == ['test']:
+    # The router tests need a replica alias: mirror one onto the test
+    # database. The router itself stays off unless a test enables it.
+    DATABASES['replica_1'] = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+
+if DB_POOL_MODE == 'pgbouncer':
+    for database in DATABASES.values():
+        database['DISABLE_SERVER_SIDE_CURSORS'] = True
+
+# In-process cache for the catalog tables (sports, locations, workout categories, exercises)
+CATALOG_CACHE_TTL = config('CATALOG_CACHE_TTL', default=300, cast=int)  # Seconds
+CATALOG_CACHE_MAXSIZE = 16
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -177,5 +260,11 @@ LOGGING = {
             'level': 'DEBUG',  # Adjust to your desired logging level
             'propagate': True,
         },
+        # Sampled GraphQL traces, one JSON line per operation
+        'core.graphql': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }
\ No newline at end of file
@@ -1,12 +1,15 @@
 from django.contrib import admin
 from django.urls import path
-from graphene_django.views import GraphQLView
 from django.views.decorators.csrf import csrf_exempt
 from core.schema import schema 
+from core.views import AsyncFitnessGraphQLView, FitnessGraphQLView, export_workouts_view, import_workouts_view
 from .views import landing
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('graphql/', csrf_exempt(GraphQLView.as_view(graphiql=True, schema=schema))),
+    path('graphql/', csrf_exempt(FitnessGraphQLView.as_view(graphiql=True, schema=schema))),
+    path('graphql/async/', csrf_exempt(AsyncFitnessGraphQLView.as_view(schema=schema))),
+    path('import/workouts/', import_workouts_view, name='import_workouts'),
+    path('export/workouts/', export_workouts_view, name='export_workouts'),
     path('', landing, name='landing'),
 ]